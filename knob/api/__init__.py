@@ -131,12 +131,24 @@ class API(wsgi.Router):
                         'action': 'index',
                         'method': 'GET'
                     },
+                    {
+                        'name': 'gate_refresh',
+                        'url': '/{gate_id}/refresh',
+                        'action': 'refresh',
+                        'method': 'POST'
+                    },
                     {
                         'name': 'add_target',
                         'url': '/{gate_id}/targets',
                         'action': 'add_target',
                         'method': 'POST'
                     },
+                    {
+                        'name': 'bulk_targets',
+                        'url': '/{gate_id}/targets/bulk',
+                        'action': 'bulk_targets',
+                        'method': 'POST'
+                    },
                     {
                         'name': 'remove_target',
                         'url': '/{gate_id}/targets/{target_id}',
@@ -169,6 +181,18 @@ class API(wsgi.Router):
                     },
                 ])
 
+        # Keys
+        connect(controller=gate_resource,
+                path_prefix='/keys',
+                routes=[
+                    {
+                        'name': 'batch_keys',
+                        'url': '/batch',
+                        'action': 'batch_keys',
+                        'method': 'POST'
+                    },
+                ])
+
         # Targets
         target_resource = targets.create_resource(conf)
         connect(controller=target_resource,
@@ -181,6 +205,26 @@ class API(wsgi.Router):
                         'method': 'POST'
                     }
                 ])
+        connect(controller=target_resource,
+                path_prefix='/gates',
+                routes=[
+                    {
+                        'name': 'gate_ssh_config',
+                        'url': '/{gate_id}/ssh_config',
+                        'action': 'ssh_config',
+                        'method': 'GET'
+                    }
+                ])
+        connect(controller=target_resource,
+                path_prefix='/ssh_config',
+                routes=[
+                    {
+                        'name': 'tenant_ssh_config',
+                        'url': '',
+                        'action': 'ssh_config',
+                        'method': 'GET'
+                    }
+                ])
         
 
         
@@ -0,0 +1,87 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Entity tags of rendered SSH configs.
+
+A config is tagged by its generation and a digest of the inputs its
+stanzas are rendered from, so it never has to be rendered in full to be
+tagged. Every gate row counts the changes of the gate and its targets,
+in the same transaction as the change, the generation of a config is
+derived from the counters of the gates it spans, so it is shared by all
+the API workers. Tags are cached per request parameters and generation,
+a conditional request for an unchanged config is answered by a single
+DB query and no Nova call.
+"""
+
+import collections
+import hashlib
+
+from oslo_config import cfg
+import six
+
+from knob.common import cache
+
+cfg.CONF.import_group('gate', 'knob.common.config')
+
+# entity tag and stanzas of a config, the stanzas may be a generator
+Config = collections.namedtuple('Config', ['etag', 'stanzas'])
+
+_etags = None
+
+
+def _etag_cache():
+    global _etags
+    if _etags is None:
+        _etags = cache.TTLCache(cfg.CONF.gate.config_cache_size,
+                                cfg.CONF.gate.config_cache_ttl)
+    return _etags
+
+
+def etag(generation, inputs):
+    """Return strong entity tag of a config.
+
+    :param generation: generation the inputs were collected at
+    :param inputs: tuples of the values every stanza is rendered from
+    """
+    digest = hashlib.sha256(six.text_type(generation).encode('utf-8'))
+    for values in inputs:
+        digest.update(b'\n')
+        digest.update(u'\0'.join(six.text_type(value)
+                                 for value in values).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def generation(counters):
+    """Return generation of a config.
+
+    :param counters: (gate id, config generation) tuples of the gates the
+                     config spans
+    """
+    digest = hashlib.sha256()
+    for gate_id, counter in sorted(counters):
+        digest.update(('%s:%s\n' % (gate_id, counter)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def get(key):
+    """Return cached entity tag or None.
+
+    :param key: request parameters, including the generation
+    """
+    return _etag_cache().get(key)
+
+
+def store(key, tag):
+    """Cache entity tag of a config and return it."""
+    _etag_cache().set(key, tag)
+    return tag
@@ -21,20 +21,21 @@
 # You should have received a copy of the GNU Lesser General Public
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
-import os
 import socket
 import sys
+import eventlet
+from oslo_concurrency import lockutils
+from oslo_config import cfg
 from oslo_log import log as logging
-from threading import Thread
+
+from knob.api import ssh_pool
 
 
 LOG = logging.getLogger(__name__)
 
+cfg.CONF.import_opt('deploy_workers', 'knob.common.config', group='gate')
+
 # conditional imports
-try:
-    from queue import Queue
-except ImportError:
-    from Queue import Queue
 try:
     import paramiko
 except ImportError:
@@ -44,11 +45,6 @@ except ImportError:
 
 
 
-EXIT_COMMAND = "exit"
-SMART_REMOVE_SCRIPT = "ssh-deploy-key.smart-remove.sh"
-SMART_APPEND_SCRIPT = "ssh-delpoy-key.smart-append.sh"
-MAX_HOST_WIDTH = 75
-
 # status constants
 AUTH_FAILURE = "AUTHENTICATION FAILURE"
 APPENDED = "APPENDED"
@@ -57,197 +53,153 @@ CONNECTION_FAILURE = "CONNECTION FAILURE"
 GENERAL_FAILURE = "GENERAL FAILURE"
 IO_FAILURE = "LOCAL IO FAILURE"
 NO_ACTION = "NO ACTION"
+NOT_FOUND = "NOT FOUND"
+NOT_READY = "NOT READY"
 SCRIPT_FAILURE = "SCRIPT FAILURE"
 SSH_FAILURE = "SSH FAILURE"
 SUCCESS = "SUCCESS"
 UNKNOWN_ERROR = "UNKNOWN ERROR"
+FAILURES = (AUTH_FAILURE, CONNECTION_FAILURE, GENERAL_FAILURE, IO_FAILURE,
+            SCRIPT_FAILURE, SSH_FAILURE, UNKNOWN_ERROR)
+CONNECT_FAILURES = (CONNECTION_FAILURE, SSH_FAILURE)
 
 # key constants
 SSH_DIR = "~/.ssh"
 AUTHORIZED_KEYS = "authorized_keys"
-SSH_PORT = 22
-TIMEOUT_SECONDS = 3
+
+# sync modes
+DIFF_MODE = "diff"
+SYNC_MODE = "sync"
+
+# Rewrites authorized_keys in a single pass. Key operations are read
+# from stdin first, one per line: "+key" to add, "-key" to remove, the
+# first line is a header so operations and file lines can be told apart
+# even if there are no operations. In sync mode only the added keys are
+# kept. Result is written to a temp file next to authorized_keys and
+# renamed over it, so the file is never seen half written.
+SYNC_KEYS_TEMPLATE = """umask 077 && mkdir -p %(ssh_dir)s && \
+touch %(ssh_dir)s/%(keys)s && \
+tmp=$(mktemp %(ssh_dir)s/.%(keys)s.XXXXXX) && \
+awk -v mode=%(mode)s '
+  { sub(/[ \\t\\r]+$/, "") }
+  FNR == NR {
+    op = substr($0, 1, 1); key = substr($0, 2)
+    if (op == "+") { if (!(key in want)) order[++n] = key; want[key] = 1 }
+    else if (op == "-") drop[key] = 1
+    next
+  }
+  $0 == "" || ($0 in drop) || ($0 in seen) { next }
+  mode == "%(sync)s" && !($0 in want) { next }
+  { seen[$0] = 1; print }
+  END { for (i = 1; i <= n; i++) if (!(order[i] in seen)) print order[i] }
+' - %(ssh_dir)s/%(keys)s > "$tmp" && \
+mv -f "$tmp" %(ssh_dir)s/%(keys)s || { rm -f "$tmp"; exit 1; }"""
+
 
 ######################################################################
-# Deployer thread
+# Remote commands
 ######################################################################
-class DeployKeyThread(Thread):
-    """
-    Consumer thread.  Reads hosts from the queue and deploys the
-    key to them.
-    """
-
-    def __init__(self, _config, queue):
-        Thread.__init__(self)
-        self.config = _config
-        self.queue = queue
-
-    def _print_status(self, server, username, statuz):
-        prefix = "  copying key to %s@%s:%s/%s " % (
-            username,
-            server,
-            SSH_DIR,
-            AUTHORIZED_KEYS)
-        suffix = "%s" % (statuz)
-        LOG.info('%s' % prefix[:MAX_HOST_WIDTH].ljust(MAX_HOST_WIDTH, ' ') + " " + suffix)
-
-    def _prepare_cmd(self, append_mode):
-        key = self.config['key']
-        
-        if append_mode is True:
-            cmd = "if ! (grep '%s' %s/%s > /dev/null 2>&1) ; then \
-                          echo '%s' >> %s/%s ; chmod 600 %s/%s ; fi" % (
-                        key, SSH_DIR, AUTHORIZED_KEYS,
-                        key, SSH_DIR, AUTHORIZED_KEYS,
-                        SSH_DIR, AUTHORIZED_KEYS)
-        else:
-            cmd = "grep -E '%s' %s/%s > /tmp/keys ; \
-                            mv /tmp/keys %s/%s ; chmod 600 %s/%s" % (
-                    key, SSH_DIR, AUTHORIZED_KEYS,
-                    SSH_DIR, AUTHORIZED_KEYS,
-                    SSH_DIR, AUTHORIZED_KEYS)
+# mode -> rendered command, keys are passed on stdin so a command does
+# not depend on the request and is rendered once per process
+_COMMANDS = {}
+
+
+def prepare_cmd(mode):
+    cmd = _COMMANDS.get(mode)
+    if cmd is None:
+        cmd = SYNC_KEYS_TEMPLATE % {'ssh_dir': SSH_DIR,
+                                    'keys': AUTHORIZED_KEYS,
+                                    'mode': mode,
+                                    'sync': SYNC_MODE}
         LOG.debug (cmd)
-        return cmd
-        
-    def _deploy_key(self, server, username):
-        ssh_client = paramiko.SSHClient()
-        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        try:
-            ssh_client.connect(
-                server,
-                username=username,
-                key_filename=self.config['private_key_file'],
-                port=SSH_PORT,
-                timeout=TIMEOUT_SECONDS)
-            #sftp_client = paramiko.SFTPClient.from_transport(ssh_client.get_transport())
-        except socket.error:
-            return CONNECTION_FAILURE
-        except paramiko.AuthenticationException:
-            return AUTH_FAILURE
-        except paramiko.SSHException: # TODO: retry this type of failure?
-            return SSH_FAILURE
-        #script = SMART_REMOVE_SCRIPT
-        append_mode = False
-        if 'append' in self.config:
-            #script = SMART_APPEND_SCRIPT
-            append_mode = True
-        cmd = self._prepare_cmd(append_mode)
-        #try:
-            #sftp_client.put(script, script)
-        #except IOError:
-        #    return IO_FAILURE
-        #_, stdout, stderr = ssh_client.exec_command('/bin/sh %s' % script)
-        _, stdout, stderr = ssh_client.exec_command('%s' % cmd)
-        if not stdout.channel.recv_exit_status() == 0:
-            LOG.warning (not stdout.channel.recv_exit_status())
-            LOG.warning ("out: %s\n err: %s\n" %(stdout.read().strip(), stderr.read().strip()))
-            return UNKNOWN_ERROR
-        #sftp_client.remove(script)
-
-        return stdout.read().strip()
-
-    def run(self):
-        #while True:
-        line = self.queue.get()
-        # support either "host" or "user@host" formats
-        words = line.split("@")
-        username = self.config['username']
-        server = words[0]
-        if len(words) > 1:
-            username = words[0]
-            server = words[1]
-        #try:
-        statuz = self._deploy_key(server, username)
-        #except:
-        #    statuz = GENERAL_FAILURE
-            # TODO: log a stack trace
-        self._print_status(server, username, statuz)
-        self.queue.task_done()
+        _COMMANDS[mode] = cmd
+    return cmd
 
 
+def prepare_input(add=(), remove=()):
+    """Render key operations fed to the sync command."""
+    lines = ['=']
+    lines.extend('+' + key.strip() for key in add if key.strip())
+    lines.extend('-' + key.strip() for key in remove if key.strip())
+    return '\n'.join(lines) + '\n'
 
-######################################################################
-# Setup
-######################################################################
-def setup(config):
+
+def execute(server, username, private_key_file, cmd, stdin_data=None,
+            host_key=None):
+    """Run command on host, return its output or a failure status.
+
+    :param host_key: expected fingerprint of the host key, if known
     """
-    Creates the installer scripts that will run on the
-    remote host(s)
+    # connections to gates are kept open and reused between calls,
+    # rewrites of the same authorized_keys are serialized
+    try:
+        with lockutils.lock('authorized-keys-%s' % server):
+            status, out, err = ssh_pool.get_pool().exec_command(
+                server,
+                username,
+                private_key_file,
+                cmd,
+                stdin_data,
+                host_key)
+    except socket.error:
+        return CONNECTION_FAILURE
+    except paramiko.AuthenticationException:
+        return AUTH_FAILURE
+    except paramiko.SSHException: # TODO: retry this type of failure?
+        return SSH_FAILURE
+    if not status == 0:
+        LOG.warning ("exit status: %s" % status)
+        LOG.warning ("out: %s\n err: %s\n" %(out, err))
+        return UNKNOWN_ERROR
+
+    return out
+
+
+def sync_keys(config):
+    """Make authorized_keys of a host hold exactly the given keys.
+
+    :param config: dict of 'host', 'username', 'private_key_file', the
+                   optional expected 'host_key' and the list of 'keys'
     """
-    key = config['key']
-    
-    smart_append_logic = """
-    # smart append
-    mkdir -p %s
-    chmod 700 %s
-    if grep "%s" %s/%s > /dev/null 2>&1
-    then
-      echo "%s"
-    else
-      echo "%s" >> %s/%s
-      echo "%s"
-      chmod 600 %s/%s
-    fi
-    """ % (
-        SSH_DIR,
-        SSH_DIR,
-        key, SSH_DIR, AUTHORIZED_KEYS,
-        NO_ACTION,
-        key, SSH_DIR, AUTHORIZED_KEYS,
-        APPENDED,
-        SSH_DIR, AUTHORIZED_KEYS)
-    stream = open(SMART_APPEND_SCRIPT, 'w')
-    stream.write(smart_append_logic)
-    stream.close()
-
-    smart_remove_logic = """
-    # smart remove mode
-    grep -E "%s" > /tmp/keys
-    mv /tmp/keys %s/%s
-    chmod 600 %s/%s
-    echo %s
-    """ % (
-        key, SSH_DIR, AUTHORIZED_KEYS,
-        SSH_DIR, AUTHORIZED_KEYS,
-        REMOVED)
-    stream = open(SMART_REMOVE_SCRIPT, 'w')
-    stream.write(smart_remove_logic)
-    stream.close()
+    return execute(config['host'], config['username'],
+                   config['private_key_file'], prepare_cmd(SYNC_MODE),
+                   prepare_input(add=config['keys']),
+                   config.get('host_key'))
 
 
 ######################################################################
-# Teardown
+# Bulk deployment
 ######################################################################
-def cleanup():
-    os.remove(SMART_REMOVE_SCRIPT)
-    os.remove(SMART_APPEND_SCRIPT)
+def deploy_keys(jobs):
+    """Apply several keys to several hosts at once.
 
+    :param jobs: dict of job id -> config, where config is like the one
+                 of sync_keys() plus 'append', True to add the keys and
+                 False to remove them
+    :returns: dict of job id -> status of the job
 
-######################################################################
-# Main flow begins here
-######################################################################
-def deploy_key(config):
-    setup(config)
-    queue = Queue(maxsize=10)
-
-    if not config['private_key_file']:
-        LOG.warning( 'Cant continue without private file')
-        exit
-    
-    #print "Starting thread %d" % i
-    deployer_thread = DeployKeyThread(config, queue)
-    deployer_thread.daemon = True
-    deployer_thread.start()
-    
-    if 'append' in config:
-        LOG.info ("Distributing key to remote hosts in smart-append mode.")
-    else:
-        LOG.info ("Removing key  from remote hosts in smart-remove mode.")
-    
-    # Either use the hosts supplied on the command line (the preference) or use hosts read from
-    # standard in.
-    queue.put(config['host'])
-    
-    queue.join()
-    cleanup()
-
+    Hosts are processed concurrently by a bounded pool of green threads,
+    all the keys of a host are applied by a single pass rewrite of its
+    authorized_keys.
+    """
+    LOG.info ("Deploying keys to %d remote hosts." % len(jobs))
+    pool = eventlet.GreenPool(cfg.CONF.gate.deploy_workers)
+
+    def run(job_id):
+        config = jobs[job_id]
+        append_mode = bool(config.get('append'))
+        if append_mode:
+            stdin_data = prepare_input(add=config['keys'])
+        else:
+            stdin_data = prepare_input(remove=config['keys'])
+        statuz = execute(config['host'], config['username'],
+                         config['private_key_file'], prepare_cmd(DIFF_MODE),
+                         stdin_data, config.get('host_key'))
+        if statuz not in FAILURES:
+            statuz = APPENDED if append_mode else REMOVED
+        LOG.info ("keys of %s@%s: %s" % (config['username'],
+                                         config['host'], statuz))
+        return job_id, statuz
+
+    return dict(pool.imap(run, [job_id for job_id in jobs
+                                if jobs[job_id]['keys']]))
@@ -12,15 +12,19 @@
 #    under the License.
 
 
-import os
-import uuid
-
 from oslo_config import cfg
 from oslo_log import log as logging
+import six
 from webob import exc
 
 from knob.api import deploy_key as engine
+from knob.api import provision
+from knob.api import reconciler
+from knob.api import ssh_pool
+from knob.api import util
+from knob.clients import nova
 from knob.common import exception
+from knob.common.i18n import _
 from knob.common import serializers
 from knob.common import wsgi
 from knob.objects import gate as gate_obj
@@ -28,8 +32,43 @@ from knob.objects import target as target_obj
 from knob.objects import key as key_obj
 
 LOG = logging.getLogger(__name__)
-MGMT_KEY_PREFIX = 'mgmt-key-'
-KEY_STORE_PATH = '/etc/knob/keys/'
+MGMT_KEY_PREFIX = provision.MGMT_KEY_PREFIX
+KEY_STORE_PATH = provision.KEY_STORE_PATH
+
+# fields exposed by the API, which may also be sorted by and selected
+GATE_FIELDS = ('id', 'name', 'server_id', 'fip_id', 'port_id', 'tenant_id',
+               'status', 'status_reason', 'floating_ip', 'fixed_ip',
+               'host_key_fingerprint', 'created_at')
+TARGET_FIELDS = ('name', 'gate_id', 'server_id', 'routable', 'created_at')
+KEY_FIELDS = ('id', 'name', 'gate_id', 'created_at')
+# relations a gate detail can be expanded with
+GATE_EXPANDS = ('keys', 'targets')
+
+# per target statuses of bulk target registration
+TARGET_CREATED = 'CREATED'
+TARGET_EXISTS = 'EXISTS'
+TARGET_IN_OTHER_GATE = 'IN OTHER GATE'
+TARGET_INVALID = 'INVALID'
+TARGET_NOT_FOUND = 'NOT FOUND'
+
+GATE_FILTERS = {
+    'name': util.PARAM_TYPE_MIXED,
+    'tenant_id': util.PARAM_TYPE_MIXED,
+    'status': util.PARAM_TYPE_MIXED,
+    util.CREATED_SINCE: util.PARAM_TYPE_SINGLE,
+    util.CREATED_BEFORE: util.PARAM_TYPE_SINGLE,
+}
+TARGET_FILTERS = {
+    'name': util.PARAM_TYPE_MIXED,
+    'server_id': util.PARAM_TYPE_MIXED,
+    util.CREATED_SINCE: util.PARAM_TYPE_SINGLE,
+    util.CREATED_BEFORE: util.PARAM_TYPE_SINGLE,
+}
+KEY_FILTERS = {
+    'name': util.PARAM_TYPE_MIXED,
+    util.CREATED_SINCE: util.PARAM_TYPE_SINGLE,
+    util.CREATED_BEFORE: util.PARAM_TYPE_SINGLE,
+}
 
 class GateController(object):
     """WSGI controller for SSH gates in Knob v1 API.
@@ -44,100 +83,101 @@ class GateController(object):
         #self.rpc_client = rpc_client.EngineClient()
 
     def format_gate(self, gate):
-        result = {
-            'id': gate.id,
-            'name': gate.name,
-            'server_id': gate.server_id,
-            'fip_id': gate.fip_id,
-            'port_id': gate.port_id,
-            'tenant_id': gate.tenant_id,
-            'created_at': gate.created_at 
-            }
-        return result
+        # sparse listings only load some of the fields
+        return dict((field, gate[field]) for field in GATE_FIELDS
+                    if gate.obj_attr_is_set(field))
 
     def format_target(self, target):
-        result = {
-            'name': target.name,
-            'gate_id': target.gate_id,
-            'server_id': target.server_id,
-            'routable': target.routable,
-            'created_at': target.created_at 
-            }
-        return result
+        return dict((field, target[field]) for field in TARGET_FIELDS
+                    if target.obj_attr_is_set(field))
 
     def format_key(self, key):
-        result = {
-            'id': key.id,
-            'name': key.name,
-            'gate_id': key.gate_id,
-            'created_at': key.created_at 
-            }
-        return result
-
+        return dict((field, key[field]) for field in KEY_FIELDS
+                    if key.obj_attr_is_set(field))
 
     def index(self, req):
-        """List SSH gates."""
+        """List SSH gates.
+
+        Supports marker/limit pagination, sort_keys/sort_dir, filters by
+        name, tenant_id, status, created_since/created_before and a
+        ``fields`` selection.
+        """
         LOG.info ('List all gates')
 
         ctx = req.context        
-        gates = gate_obj.Gate.get_all(ctx)
+        params = util.get_list_params(req, GATE_FILTERS, GATE_FIELDS)
+        gates = gate_obj.Gate.get_all(ctx, **params)
         result = [self.format_gate(gate) for gate in gates]
         
         return {'gates': result}
 
+    def _get_expand(self, req):
+        expand = []
+        for value in req.params.getall('expand'):
+            for relation in value.split(','):
+                relation = relation.strip()
+                if relation not in GATE_EXPANDS:
+                    raise exc.HTTPBadRequest(
+                        _('Invalid expand: %(value)s, expected one of '
+                          '%(allowed)s') %
+                        {'value': relation,
+                         'allowed': ', '.join(GATE_EXPANDS)})
+                if relation not in expand:
+                    expand.append(relation)
+        return expand
+
+    def _get_gate(self, ctx, gate_id, expand):
+        if not expand:
+            return gate_obj.Gate.get_by_id(ctx, gate_id), {}
+        # gate and its relations are loaded together
+        return gate_obj.Gate.get_expanded(ctx, gate_id, expand)
+
     def show(self, req, gate_id):
-        """Gets detailed information for a SSH gate."""
+        """Gets detailed information for a SSH gate.
+
+        Pass ``wait=<seconds>`` to long-poll a BUILDING gate until it
+        becomes ACTIVE or ERROR, and ``expand=keys,targets`` to include
+        keys and targets of the gate.
+        """
         LOG.info ('Show information about gate: %s ' % gate_id)
         ctx = req.context
-        gates = gate_obj.Gate.get_by_id(ctx, gate_id) 
-        return {'gates': gates}
-
-    def _create_keypair(self, ctx, name):
-        # create new key
-        key_name = MGMT_KEY_PREFIX + name
-        # create key and store at nova DB
-        key = ctx.nova_client.keypair_create(key_name)
-        return key
-        
-    def _store_keypair(self, ctx, gate_id, key):
-        # store private key for further usage
-        stream = open(KEY_STORE_PATH+key['name'], 'w')
-        stream.write(key['private_key'])
-        stream.close()
-        
-        # DB update: store mgmt key along with gate
-        key_obj.Key.create(
-            ctx,dict(name=key['name'],
-                     content=key['public_key'],
-                     gate_id=gate_id))
-        
-    def _delete_keypair(self, ctx, name):
-        key_name = MGMT_KEY_PREFIX + name
-        # remove nova key
-        ctx.nova_client.keypair_delete(key_name)
-        
-        # remove private key file
-        key_path = KEY_STORE_PATH+key_name
-        os.remove(key_path)
-        
-        # remove knob key reference
-        key_obj.Key.delete_by_name(ctx, key_name)
-        
-        
+        expand = self._get_expand(req)
+        gate, relations = self._get_gate(ctx, gate_id, expand)
+        wait = req.params.get('wait')
+        if wait and gate.status == provision.GATE_BUILDING:
+            try:
+                timeout = min(int(wait), cfg.CONF.gate.max_wait_timeout)
+            except ValueError:
+                raise exc.HTTPBadRequest('Invalid wait timeout: %s' % wait)
+            provision.get_provisioner().wait(ctx, gate_id, timeout)
+            ctx.session.expire_all()
+            gate, relations = self._get_gate(ctx, gate_id, expand)
+        result = self.format_gate(gate)
+        formatters = {'keys': self.format_key,
+                      'targets': self.format_target}
+        for relation, objs in relations.items():
+            result[relation] = [formatters[relation](obj) for obj in objs]
+        return {'gates': result}
 
     def create(self, req, body):
-        """Create a new SSH gate."""        
+        """Create a new SSH gate.
+
+        Gate is stored in BUILDING state and provisioned in background,
+        clients poll (or long-poll) the gate to learn when it is ready.
+        The gate belongs to the project of the request token, as set by
+        the auth middleware in the X-Project-Id header.
+        """
         LOG.info ('Creating new gate ')
         create_data = dict((k, body.get(k)) for k in (
             'name', 'net_id', 'public_net_id', 'flavor', 'image', 'security_groups'))
         
         ctx = req.context
         
-        project_id = ctx.keystone_client.projects.list(name=ctx.tenant_name)[0].id
-        LOG.debug('Identify project id: %s from name' % project_id)
-        
-        if 'public_net_id' not in create_data:
+        if create_data['name'] is None or create_data['public_net_id'] is None:
             raise exc.HTTPBadRequest('Not supplied required parameter')
+        if not ctx.tenant_id:
+            # gates are scoped by the project, see _gate_query
+            raise exc.HTTPBadRequest('Request is not scoped to a project')
         
         if create_data['image'] is None:
             create_data['image'] = cfg.CONF.gate.image
@@ -148,48 +188,16 @@ class GateController(object):
         if create_data['security_groups'] is None:
             create_data['security_groups'] = cfg.CONF.gate.security_groups
         
-        # add controller host as 'allowed' to security group once
-        ctx.neutron_client.update_security_groups(project_id, 
-                                                  create_data['security_groups'],
-                                                  create_data['public_net_id'])
-        # create key
-        key_class = self._create_keypair(ctx, create_data['name'])
-        key = key_class.to_dict()
-        create_data['key_name'] = key['name']
-        LOG.info('Created management key for upcoming service gate')
-                
-        # create port
-        port_id = ctx.neutron_client.create_port(create_data)
-        create_data['port-id'] = port_id
-        LOG.info('Created neutron port to deploy gate on it')
-        
-        # update network configuration with given port id
-        server_id = ctx.nova_client.create_service_vm(create_data)
-        if server_id is None:
-           LOG.info('Gate: %s is not running need to clear resources')
-           return {'gates': None}
-        else:
-           LOG.info('Service gate is up and running')
-
-        # create fip and to attach to given port
-        fip_id = ctx.neutron_client.associate_fip(port_id, create_data['public_net_id'])
-        LOG.info('Attached floating IP to make service gate accessible from outside')
-
-        # DB update: crete new gate 
+        # DB update: crete new gate, resources are attached while building
         gate_ref = gate_obj.Gate.create(
                 ctx,dict(name=create_data['name'],
-                             server_id=server_id,
-                             fip_id=fip_id,
-                             port_id=port_id,
-                             tenant_id=project_id))
-        LOG.info('Update service database')
-        
-        # store keypair for further use
-        self._store_keypair(ctx, gate_ref['id'], key)
-        LOG.info('Store private key locally')
-        
+                         tenant_id=ctx.tenant_id,
+                         status=provision.GATE_BUILDING,
+                         status_reason=_('Gate is scheduled')))
         result = self.format_gate(gate_ref)
-        LOG.info('Gate: %s is created successfully' % gate_ref.name)
+
+        provision.get_provisioner().submit(ctx, gate_ref.id, create_data)
+        LOG.info('Gate: %s is scheduled for provisioning' % gate_ref.name)
         return {'gates': result}
     
     def delete(self, req, gate_id):
@@ -199,82 +207,221 @@ class GateController(object):
         ctx = req.context
         # lookup correct gate by id
         gate_ref = gate_obj.Gate.get_by_id(ctx, gate_id)
+        if (gate_ref['status'] == provision.GATE_BUILDING and
+                not provision.get_provisioner().is_abandoned(gate_ref)):
+            raise exc.HTTPConflict('Gate %s is still building' % gate_id)
+
+        # gates failed to build or half deleted may miss some of the
+        # resources, those already gone are skipped
         server_id = gate_ref['server_id']
         fip_id = gate_ref['fip_id']
         port_id = gate_ref['port_id']
         # remove server
-        LOG.info ('Removing service VM with ID: %s ' % server_id)
-        ctx.nova_client.remove_service_vm(server_id)
+        if server_id is not None:
+            LOG.info ('Removing service VM with ID: %s ' % server_id)
+            try:
+                ctx.nova_client.remove_service_vm(server_id)
+            except Exception as ex:
+                ctx.nova_client.ignore_not_found(ex)
         
         # disassociate fip & delete port
-        LOG.info ('Disassociate floating ip: %s ' % fip_id)
-        ctx.neutron_client.disassociate_fip(fip_id)
+        if fip_id is not None:
+            LOG.info ('Disassociate floating ip: %s ' % fip_id)
+            try:
+                ctx.neutron_client.disassociate_fip(fip_id)
+            except Exception as ex:
+                ctx.neutron_client.ignore_not_found(ex)
+        if server_id is not None:
+            nova.invalidate_addresses(server_id)
         
         # remove neutron port explicitly
-        LOG.info ('Deleting knob service port: %s ' % port_id)
-        ctx.neutron_client.delete_port(port_id)
+        if port_id is not None:
+            LOG.info ('Deleting knob service port: %s ' % port_id)
+            try:
+                ctx.neutron_client.delete_port(port_id)
+            except Exception as ex:
+                ctx.neutron_client.ignore_not_found(ex)
 
         #remove mgmt key pair
         LOG.info ('Deleting mgmt. public key from Nova: %s ' % gate_ref['name'])
-        self._delete_keypair(ctx,  gate_ref['name'])
+        provision.delete_keypair(ctx,  gate_ref['name'])
         
         # remove gate object from DB
         LOG.info ('Delete gate entry from service database')
         gate_obj.Gate.delete(ctx, gate_id)
-        LOG.info('Gate: %s is created successfully' % gate_id)
+        reconciler.get_reconciler().forget(gate_ref.id)
+        LOG.info('Gate: %s is deleted successfully' % gate_id)
         
+    def refresh(self, req, gate_id):
+        """Re-read addresses and host key of a gate, e.g. after a change."""
+        LOG.info ('Refreshing gate: %s ' % gate_id)
+        ctx = req.context
+        gate_ref = gate_obj.Gate.get_by_id(ctx, gate_id)
+        if gate_ref['status'] == provision.GATE_BUILDING:
+            raise exc.HTTPConflict('Gate %s is still building' % gate_id)
+        if gate_ref['server_id'] is None:
+            raise exc.HTTPConflict('Gate %s has no server' % gate_id)
+
+        nova.invalidate_addresses(gate_ref['server_id'])
+        server = ctx.get_server(gate_ref['server_id'])
+        nova.cache_addresses(server)
+        values = {
+            'floating_ip': ctx.nova_client.server_ip(
+                server, 'private', 4, 'floating'),
+            'fixed_ip': ctx.nova_client.server_ip(
+                server, 'private', 4, 'fixed'),
+            }
+        if values['floating_ip'] is not None:
+            key_name = MGMT_KEY_PREFIX + gate_ref['name']
+            try:
+                values['host_key_fingerprint'] = (
+                    ssh_pool.get_pool().host_key_fingerprint(
+                        values['floating_ip'], cfg.CONF.gate.user,
+                        KEY_STORE_PATH + key_name))
+            except Exception as ex:
+                LOG.warning('Failed to read host key of gate %s: %s' %
+                            (gate_id, ex))
+
+        gate_ref = gate_obj.Gate.update_by_id(ctx, gate_ref.id, values)
+        self._sync_keys(ctx, gate_ref)
+        return {'gates': self.format_gate(gate_ref)}
+
     def add_target(self, req, gate_id, body):
         """Add target to gate."""
         data = dict((k, body.get(k)) for k in (
             'server_id', 'gate_id', 'name','routable'))
         LOG.info ('Add target: %s to gate %s ' % (data['name'], gate_id))
         ctx = req.context
+        # verify if gate exists and is visible to the tenant
+        gate_ref = gate_obj.Gate.get_by_id(ctx, gate_id)
+        if (data['gate_id'] is not None and
+                six.text_type(data['gate_id']) != six.text_type(gate_ref.id)):
+            raise exc.HTTPBadRequest('Gate id %s does not match the URL' %
+                                     data['gate_id'])
         # verify if target VM exists
         try:
-            ctx.nova_client.get_server(data['server_id'])
+            ctx.get_server(data['server_id'])
         except exception.EntityNotFound:
             return {'targets': None}
+
+        # DB update, the target is attached to the scoped gate only
+        target_ref = target_obj.Target.create(
+            ctx,dict(server_id=data['server_id'],
+                     gate_id=gate_ref.id,
+                     name=data['name'],
+                     routable=data['routable']))
+
+        LOG.debug('Target: %s is created successfully' % target_ref.name)
+        result = self.format_target(target_ref) 
+        return {'targets': result}
         
-        # verify if gate exists
+    def bulk_targets(self, req, gate_id, body):
+        """Add many targets to gate at once.
+
+        Servers are validated by a single Nova call and the targets are
+        stored by a single multi-row insert. Status is reported per target.
+        """
+        targets = body.get('targets') or []
+        if not targets:
+            raise exc.HTTPBadRequest('Not supplied required parameter')
+        if (not isinstance(targets, list) or
+                any(not isinstance(target, dict) for target in targets)):
+            raise exc.HTTPBadRequest('Invalid targets')
+        LOG.info ('Add %d targets to gate %s ' % (len(targets), gate_id))
+        ctx = req.context
         gate_ref = gate_obj.Gate.get_by_id(ctx, gate_id)
-        if gate_ref is not None:
-            # DB update 
-            target_ref = target_obj.Target.create(
-                ctx,dict(server_id=data['server_id'],
-                         gate_id=data['gate_id'],
-                         name=data['name'],
-                         routable=data['routable']))
-            
-            LOG.debug('Target: %s is created successfully' % target_ref.name)
-            result = self.format_target(target_ref) 
-            return {'targets': result}
-        else:
-            return {'targets': None}
-        
+
+        server_ids = [target.get('server_id') for target in targets
+                      if target.get('server_id')]
+        servers = ctx.get_servers(server_ids)
+
+        results = []
+        values = []
+        seen = set()
+        for target in targets:
+            server_id = target.get('server_id')
+            # routable is not nullable
+            routable = target.get('routable')
+            if routable is None:
+                routable = False
+            result = {'server_id': server_id,
+                      'name': target.get('name'),
+                      'gate_id': gate_ref.id}
+            results.append(result)
+            if (not isinstance(server_id, six.string_types) or
+                    not server_id or not isinstance(routable, bool)):
+                result['status'] = TARGET_INVALID
+            elif server_id not in servers:
+                result['status'] = TARGET_NOT_FOUND
+            elif server_id in seen:
+                result['status'] = TARGET_EXISTS
+            else:
+                seen.add(server_id)
+                values.append(dict(server_id=server_id,
+                                   gate_id=gate_ref.id,
+                                   name=target.get('name'),
+                                   routable=routable))
+
+        # DB update: all the targets are stored by a single transaction
+        existing = target_obj.Target.create_all(ctx, values)
+        for result in results:
+            if 'status' in result:
+                continue
+            if result['server_id'] not in existing:
+                result['status'] = TARGET_CREATED
+            elif existing[result['server_id']] == gate_ref.id:
+                result['status'] = TARGET_EXISTS
+            else:
+                # a server is reachable through a single gate
+                result['status'] = TARGET_IN_OTHER_GATE
+        LOG.debug('%d targets are created successfully' %
+                  (len(values) - len(existing)))
+        return {'targets': results}
+
     def remove_target(self, req, gate_id, target_id):
         """Remove target to gate."""
         LOG.info ('Remove target: %s from gate %s ' % (target_id, gate_id))
         ctx = req.context
         # verify if target VM exists
         try:
-            ctx.nova_client.get_server(target_id)
+            ctx.get_server(target_id)
         except exception.EntityNotFound:
             return {'targets': None}
         
         #verify if gate_id exists
-        target_ref = target_obj.Target.get_all_by_args(ctx, gate_id, target_id)
-        if target_ref is not None:
+        gate_ref = gate_obj.Gate.get_by_id(ctx, gate_id)
+        target_ref = target_obj.Target.get_all_by_args(ctx, gate_ref.id,
+                                                       target_id)
+        if target_ref:
             target_obj.Target.delete(ctx,target_id)
-        
+            
     def list_targets(self, req, gate_id):
         """List targets on gate."""
         LOG.info ('List targets on gate: %s' % gate_id)
 
         ctx = req.context
-        targets = target_obj.Target.get_all_by_args(ctx, gate_id)
+        params = util.get_list_params(req, TARGET_FILTERS, TARGET_FIELDS)
+        # gate must be visible to the tenant
+        gate_obj.Gate.get_by_id(ctx, gate_id)
+        targets = target_obj.Target.get_all(ctx, gate_id, **params)
         result = [self.format_target(target) for target in targets]
         return {'targets': result}
     
+    def _check_ready(self, gate_ref):
+        # keys of gates without a server can not be synced
+        if gate_ref['status'] in (provision.GATE_BUILDING,
+                                  provision.GATE_ERROR):
+            raise exc.HTTPConflict('Gate %s is not ready' % gate_ref.id)
+
+    def _sync_keys(self, ctx, gate_ref):
+        try:
+            server_ip = provision.gate_address(ctx, gate_ref)
+        except exception.EntityNotFound:
+            # DB is already updated, the reconciler retries
+            LOG.warning('Address of gate %s is unknown' % gate_ref.id)
+            server_ip = None
+        reconciler.get_reconciler().notify(gate_ref.id, server_ip)
+
     def add_key(self, req, gate_id, body):
         """Add key to gate."""
         data = dict((k, body.get(k)) for k in (
@@ -283,26 +430,18 @@ class GateController(object):
         LOG.info ('Add key: %s to gate %s ' % 
                (data['name'], gate_id))
         ctx = req.context
+        # gate must be visible to the tenant
+        gate_ref = gate_obj.Gate.get_by_id(ctx, gate_id)
+        self._check_ready(gate_ref)
         # DB update 
         key_ref = key_obj.Key.create(
             ctx,dict(name=data['name'],
                      content=data['key_content'],
-                     gate_id=gate_id))
-        
-        gate_ref = gate_obj.Gate.get_by_id(ctx, gate_id)
-        server_id = gate_ref['server_id']
-        server_ip = ctx.nova_client.get_ip(server_id, 'private', 4,'floating')
-        
-        key_name = KEY_STORE_PATH + MGMT_KEY_PREFIX + gate_ref['name']
-        config = {
-            'private_key_file': key_name,
-            'username': cfg.CONF.gate.user,
-            'append': True,
-            'host': server_ip,
-            'key': data['key_content']
-            }
-        engine.deploy_key(config)
+                     gate_id=gate_ref.id))
         
+        # keys are pushed to the gate by the reconciler, which retries
+        # until the gate converges with the DB
+        self._sync_keys(ctx, gate_ref)
 
         LOG.debug('Key record: %s is created successfully' % key_ref.name)
         result = self.format_key(key_ref) 
@@ -313,38 +452,139 @@ class GateController(object):
         LOG.info ('Remove key: %s from gate %s ' % (key_id, gate_id))
         ctx = req.context
         
-        #verify if gate_id exists
-        key_ref = key_obj.Key.get_all_by_args(ctx, gate_id, key_id)
-        if key_ref is not None:
+        #verify if gate_id exists and is visible to the tenant
+        gate_ref = gate_obj.Gate.get_by_id(ctx, gate_id)
+        self._check_ready(gate_ref)
+        key_ref = key_obj.Key.get_all_by_args(ctx, gate_ref.id, key_id)
+        if key_ref:
             key_obj.Key.delete(ctx,key_id)
             
-            gate_ref = gate_obj.Gate.get_by_id(ctx, gate_id)
-            server_id = gate_ref['server_id']
-            server_ip = ctx.nova_client.get_ip(server_id, 'private', 4,'floating')
-            
-            key_name = KEY_STORE_PATH + MGMT_KEY_PREFIX + gate_ref['name']
-            config = {
-                'private_key_file': key_name,
+            self._sync_keys(ctx, gate_ref)
+        
+    def batch_keys(self, req, body):
+        """Add many keys to many gates at once.
+
+        Keys of a gate are applied by a single remote command, gates are
+        processed concurrently. Status is reported per (gate, key).
+        """
+        keys = body.get('keys') or []
+        gate_ids = body.get('gates') or []
+        if not keys or not gate_ids:
+            raise exc.HTTPBadRequest('Not supplied required parameter')
+        if not isinstance(keys, list) or not isinstance(gate_ids, list):
+            raise exc.HTTPBadRequest('Invalid keys or gates')
+        if any(not isinstance(key, dict) or key.get('key_content') is None
+               for key in keys):
+            raise exc.HTTPBadRequest('Not supplied required parameter')
+        if any(not isinstance(gate_id, (six.string_types, six.integer_types))
+               for gate_id in gate_ids):
+            raise exc.HTTPBadRequest('Invalid gate id')
+        # keys are added to every gate once, however often it is listed
+        unique = []
+        seen = set()
+        for gate_id in gate_ids:
+            if six.text_type(gate_id) not in seen:
+                seen.add(six.text_type(gate_id))
+                unique.append(gate_id)
+        gate_ids = unique
+
+        LOG.info ('Add %d keys to %d gates' % (len(keys), len(gate_ids)))
+        ctx = req.context
+
+        results = []
+        ready = []
+        for gate_id in gate_ids:
+            try:
+                gate_ref = gate_obj.Gate.get_by_id(ctx, gate_id)
+            except exception.NotFound:
+                statuz = engine.NOT_FOUND
+            else:
+                statuz = None
+                if gate_ref['status'] in (provision.GATE_BUILDING,
+                                          provision.GATE_ERROR):
+                    statuz = engine.NOT_READY
+            if statuz is not None:
+                results.extend({'gate_id': gate_id,
+                                'name': key.get('name'),
+                                'status': statuz} for key in keys)
+                continue
+            ready.append(gate_ref)
+
+        # servers of gates without stored address are resolved at once
+        ctx.get_servers([gate_ref['server_id'] for gate_ref in ready
+                         if not gate_ref['floating_ip']])
+        values = []
+        jobs = {}
+        servers = {}
+        for gate_ref in ready:
+            try:
+                server_ip = provision.gate_address(ctx, gate_ref)
+            except exception.EntityNotFound:
+                # server of the gate is gone, other gates go on
+                results.extend({'gate_id': gate_ref.id,
+                                'name': key.get('name'),
+                                'status': engine.NOT_FOUND} for key in keys)
+                continue
+            servers[gate_ref.id] = gate_ref['server_id']
+            jobs[gate_ref.id] = {
+                'private_key_file': (KEY_STORE_PATH + MGMT_KEY_PREFIX +
+                                     gate_ref['name']),
                 'username': cfg.CONF.gate.user,
-                'append': False,
+                'append': True,
                 'host': server_ip,
-                'key': key_ref['content']
+                'host_key': gate_ref['host_key_fingerprint'],
+                'keys': [key['key_content'] for key in keys]
                 }
-            engine.deploy_key(config)
-        
+            values.extend(dict(name=key.get('name'),
+                               content=key['key_content'],
+                               gate_id=gate_ref.id) for key in keys)
+
+        # DB update: all the keys are stored by a single transaction
+        key_refs = key_obj.Key.create_all(ctx, values)
+        statuses = engine.deploy_keys(jobs)
+        for gate_id, statuz in statuses.items():
+            if statuz in engine.FAILURES:
+                if statuz in engine.CONNECT_FAILURES:
+                    # address of the gate may have changed
+                    nova.invalidate_addresses(servers[gate_id])
+                # retried by the reconciler until the gate converges
+                reconciler.get_reconciler().notify(gate_id,
+                                                   jobs[gate_id]['host'])
+            else:
+                reconciler.get_reconciler().record_appended(
+                    ctx, gate_id, set(key_ref.id for key_ref in key_refs
+                                      if key_ref.gate_id == gate_id))
+        for key_ref in key_refs:
+            result = self.format_key(key_ref)
+            result['status'] = statuses.get(key_ref.gate_id)
+            results.append(result)
+        return {'keys': results}
+
     def list_keys(self, req, gate_id):
         """List keys on gate."""
         LOG.info ('List keys on gate: %s' % gate_id)
 
         ctx = req.context
-        keys = key_obj.Key.get_all_by_args(ctx, gate_id)
+        params = util.get_list_params(req, KEY_FILTERS, KEY_FIELDS)
+        # gate must be visible to the tenant
+        gate_obj.Gate.get_by_id(ctx, gate_id)
+        keys = key_obj.Key.get_all(ctx, gate_id, **params)
         result = [self.format_key(key) for key in keys]
         return {'keys': result}
 
         
+class GateSerializer(serializers.JSONResponseSerializer):
+    """Serializer for SSH gates responses."""
+
+    def create(self, response, result):
+        # gate is accepted for building, not built yet
+        self.default(response, result)
+        response.status = 202
+
+
 def create_resource(options):
     """SSH gates resource factory method."""
     deserializer = wsgi.JSONRequestDeserializer()
-    serializer = serializers.JSONResponseSerializer()
+    serializer = GateSerializer()
     return wsgi.Resource(
         GateController(options), deserializer, serializer)
@@ -67,6 +67,7 @@ class FaultWrapper(wsgi.Middleware):
         'InvalidTenant': webob.exc.HTTPForbidden,
         'Forbidden': webob.exc.HTTPForbidden,
         'StackExists': webob.exc.HTTPConflict,
+        'DbObjectDuplicateEntry': webob.exc.HTTPConflict,
         'StackValidationFailed': webob.exc.HTTPBadRequest,
         'InvalidSchemaError': webob.exc.HTTPBadRequest,
         'InvalidTemplateReference': webob.exc.HTTPBadRequest,
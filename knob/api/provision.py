@@ -0,0 +1,315 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Background provisioning of SSH gates.
+
+A gate is created in BUILDING state by the API and then driven through
+the provisioning steps by a pool of green threads. Every step persists
+its progress and the resources it created on the gate row, so a failed
+gate can always be cleaned up by a regular delete. Builds interrupted
+by a restart of their API worker are failed at startup.
+"""
+
+import os
+import socket
+
+import eventlet
+from eventlet import event
+from eventlet import queue
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import timeutils
+import paramiko
+from retrying import retry
+import six
+
+from knob.api import ssh_pool
+from knob.common import context
+from knob.common import dag
+from knob.common import sessions
+from knob.common import exception
+from knob.common.i18n import _
+from knob.objects import gate as gate_obj
+from knob.objects import key as key_obj
+
+LOG = logging.getLogger(__name__)
+
+MGMT_KEY_PREFIX = 'mgmt-key-'
+KEY_STORE_PATH = '/etc/knob/keys/'
+
+# gate states
+GATE_BUILDING = 'BUILDING'
+GATE_ACTIVE = 'ACTIVE'
+GATE_ERROR = 'ERROR'
+TERMINAL_STATES = (GATE_ACTIVE, GATE_ERROR)
+
+
+def create_keypair(ctx, name):
+    # create new key
+    key_name = MGMT_KEY_PREFIX + name
+    # create key and store at nova DB
+    key = ctx.nova_client.keypair_create(key_name)
+    return key
+
+
+def store_keypair(ctx, gate_id, key):
+    # store private key for further usage
+    stream = open(KEY_STORE_PATH+key['name'], 'w')
+    stream.write(key['private_key'])
+    stream.close()
+
+    # DB update: store mgmt key along with gate
+    key_obj.Key.create(
+        ctx,dict(name=key['name'],
+                 content=key['public_key'],
+                 gate_id=gate_id))
+
+
+def delete_keypair(ctx, name):
+    key_name = MGMT_KEY_PREFIX + name
+    # remove nova key, it may be missing if gate failed to build
+    try:
+        ctx.nova_client.keypair_delete(key_name)
+    except Exception as ex:
+        ctx.nova_client.ignore_not_found(ex)
+
+    # remove private key file
+    key_path = KEY_STORE_PATH+key_name
+    if os.path.exists(key_path):
+        os.remove(key_path)
+
+    # remove knob key reference
+    key_obj.Key.delete_by_name(ctx, key_name)
+
+
+def retry_if_ssh_err(exception):
+    return isinstance(exception, (paramiko.SSHException, socket.error))
+
+
+@retry(stop_max_delay=60000, wait_fixed=3000,
+       retry_on_exception=retry_if_ssh_err)
+def read_host_key(host, key_name):
+    """Return fingerprint of the gate host key, waiting for SSH to start."""
+    return ssh_pool.get_pool().host_key_fingerprint(
+        host, cfg.CONF.gate.user, KEY_STORE_PATH + key_name)
+
+
+def gate_address(ctx, gate):
+    """Return address knob reaches the gate at."""
+    if gate.floating_ip:
+        return gate.floating_ip
+    # gates built before addresses were stored in DB
+    return ctx.get_ip(gate.server_id, 'private', 4, 'floating')
+
+
+def is_stale(gate):
+    """Return True for a BUILDING gate without progress for build_timeout."""
+    if gate.status != GATE_BUILDING:
+        return False
+    # every provisioning step updates the gate
+    progress = gate.updated_at or gate.created_at
+    return timeutils.is_older_than(progress, cfg.CONF.gate.build_timeout)
+
+
+def recover_builds():
+    """Fail gates whose build was interrupted, e.g. by a restart.
+
+    Builds can not be resumed, they run with the credentials of the
+    request creating the gate. Failed gates keep the ids of the
+    resources created so far and are cleaned up by a regular delete.
+    """
+    ctx = context.get_admin_context()
+    gates = gate_obj.Gate.get_all(
+        ctx, filters={'status': GATE_BUILDING},
+        fields=['status', 'created_at', 'updated_at'])
+    for gate in gates:
+        if is_stale(gate):
+            LOG.warning('Build of gate %s was interrupted' % gate.id)
+            gate_obj.Gate.update_by_id(
+                ctx, gate.id,
+                {'status': GATE_ERROR,
+                 'status_reason': _('Gate build was interrupted')})
+
+
+class GateProvisioner(object):
+    """Drives BUILDING gates to ACTIVE or ERROR state in background."""
+
+    def __init__(self, pool_size):
+        self._pool_size = pool_size
+        self._pool = None
+        # builds waiting for a free worker, submit never blocks on it
+        self._queue = queue.LightQueue()
+        # gate_id -> event sent once provisioning of the gate is over
+        self._waiters = {}
+
+    def submit(self, ctx, gate_id, create_data):
+        """Schedule provisioning of a gate already stored in BUILDING.
+
+        Builds are queued and returned immediately, at most pool_size of
+        them run at once.
+        """
+        if self._pool is None:
+            # workers are started in the API worker serving requests
+            self._pool = eventlet.GreenPool(self._pool_size)
+            for _i in range(self._pool_size):
+                self._pool.spawn_n(self._work)
+        done = event.Event()
+        self._waiters[gate_id] = done
+        self._queue.put((ctx, gate_id, create_data, done))
+
+    def _work(self):
+        while True:
+            self._run(*self._queue.get())
+
+    def is_abandoned(self, gate):
+        """Return True for a stale BUILDING gate not built by this worker."""
+        return gate.id not in self._waiters and is_stale(gate)
+
+    def wait(self, ctx, gate_id, timeout):
+        """Block until gate leaves BUILDING state or timeout expires.
+
+        Gates provisioned by this process are waited for through an
+        event, gates provisioned by another API worker are polled in DB.
+        """
+        done = self._waiters.get(gate_id)
+        with eventlet.Timeout(timeout, False):
+            if done is not None:
+                done.wait()
+                return
+            while True:
+                ctx.session.expire_all()
+                gate = gate_obj.Gate.get_by_id(ctx, gate_id)
+                if gate.status != GATE_BUILDING:
+                    return
+                eventlet.sleep(cfg.CONF.gate.wait_poll_interval)
+
+    def _run(self, ctx, gate_id, create_data, done):
+        try:
+            self._provision(ctx, gate_id, create_data)
+        except Exception as ex:
+            LOG.exception('Gate %s failed to build' % gate_id)
+            if sessions.is_rejected(ex):
+                ctx.invalidate_session()
+            self._update(ctx, gate_id, status=GATE_ERROR,
+                         status_reason=six.text_type(ex))
+        else:
+            self._update(ctx, gate_id, status=GATE_ACTIVE,
+                         status_reason=_('Gate is ready'))
+            LOG.info('Gate: %s is created successfully' % gate_id)
+        finally:
+            self._waiters.pop(gate_id, None)
+            done.send()
+
+    def _update(self, ctx, gate_id, **values):
+        return gate_obj.Gate.update_by_id(ctx, gate_id, values)
+
+    def _step(self, ctx, gate_id, reason, **values):
+        LOG.info('Gate %s: %s' % (gate_id, reason))
+        values['status_reason'] = reason
+        self._update(ctx, gate_id, **values)
+
+    def _provision(self, ctx, gate_id, create_data):
+        """Run provisioning steps, independent ones concurrently.
+
+        Neutron and Nova calls not depending on each other are issued
+        at once, the server is booted as soon as key, port and
+        security groups are ready.
+        """
+
+        def security_groups():
+            # add controller host as 'allowed' to security group once,
+            # the gate project is the one of the request
+            ctx.neutron_client.update_security_groups(
+                ctx.tenant_id,
+                create_data['security_groups'],
+                create_data['public_net_id'])
+
+        def keypair():
+            return create_keypair(ctx, create_data['name']).to_dict()
+
+        def port():
+            return ctx.neutron_client.create_port(create_data)
+
+        def server(keypair, port, security_groups):
+            data = dict(create_data, key_name=keypair['name'])
+            data['port-id'] = port
+            server_id = ctx.nova_client.boot_service_vm(data)
+            if server_id is None:
+                raise exception.ResourceInError(
+                    resource_status=GATE_ERROR,
+                    status_reason=_('Failed to boot gate server'))
+            return server_id
+
+        def active(server):
+            if not ctx.nova_client.wait_service_vm(server):
+                raise exception.ResourceInError(
+                    resource_status=GATE_ERROR,
+                    status_reason=_('Gate server did not become active'))
+
+        def fip(active, port):
+            # create fip and to attach to given port
+            return ctx.neutron_client.associate_fip(
+                port, create_data['public_net_id'])
+
+        def host_key(fip, keypair):
+            # best effort, the gate is usable without a known host key
+            try:
+                return read_host_key(fip['floating_ip_address'],
+                                     keypair['name'])
+            except Exception as ex:
+                LOG.warning('Failed to read host key of gate %s: %s' %
+                            (gate_id, ex))
+
+        graph = dag.StepGraph()
+        graph.add('security_groups', security_groups)
+        graph.add('keypair', keypair)
+        graph.add('port', port)
+        graph.add('server', server,
+                  requires=('keypair', 'port', 'security_groups'))
+        graph.add('active', active, requires=('server',))
+        graph.add('fip', fip, requires=('active', 'port'))
+        graph.add('host_key', host_key, requires=('fip', 'keypair'))
+
+        def persist(name, result):
+            # runs in this green thread only, DB session is not shared
+            if name == 'keypair':
+                store_keypair(ctx, gate_id, result)
+                self._step(ctx, gate_id, _('Created management key'))
+            elif name == 'port':
+                self._step(ctx, gate_id, _('Created port'), port_id=result)
+            elif name == 'server':
+                self._step(ctx, gate_id,
+                           _('Waiting for server to become active'),
+                           server_id=result)
+            elif name == 'fip':
+                self._step(ctx, gate_id, _('Associated floating IP'),
+                           fip_id=result['id'],
+                           floating_ip=result['floating_ip_address'],
+                           fixed_ip=result['fixed_ip_address'])
+            elif name == 'host_key' and result is not None:
+                self._step(ctx, gate_id, _('Recorded host key'),
+                           host_key_fingerprint=result)
+
+        self._step(ctx, gate_id, _('Building gate resources'))
+        graph.run(on_complete=persist)
+
+
+_provisioner = None
+
+
+def get_provisioner():
+    """Return provisioner of the current API worker process."""
+    global _provisioner
+    if _provisioner is None:
+        _provisioner = GateProvisioner(cfg.CONF.gate.provision_workers)
+    return _provisioner
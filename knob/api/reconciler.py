@@ -0,0 +1,187 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Desired state reconciliation of gate keys.
+
+The gate_keys table is the source of truth. For every gate the desired
+key set is fingerprinted and compared with the fingerprint of the set
+last applied to the gate VM, recorded on the gate row, only gates whose
+sets differ are synced.
+Gates are reconciled on change events and periodically, so a failed
+push is retried until the VM converges with the DB.
+"""
+
+import hashlib
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from knob.api import deploy_key as engine
+from knob.api import provision
+from knob.clients import nova
+from knob.common import context
+from knob.common import exception
+from knob.objects import gate as gate_obj
+from knob.objects import key as key_obj
+
+LOG = logging.getLogger(__name__)
+
+cfg.CONF.import_group('gate', 'knob.common.config')
+
+
+def fingerprint(keys):
+    """Return fingerprint of a key set, independent of the keys order."""
+    digest = hashlib.sha256()
+    for key in sorted(set(key.strip() for key in keys if key.strip())):
+        digest.update(key.encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class KeyReconciler(object):
+    """Pushes desired key sets to the gates which diverged from them."""
+
+    def __init__(self, interval, pool_size):
+        self.interval = interval
+        self._pool = eventlet.GreenPool(pool_size)
+        # gate_id -> address of gates built before addresses were stored
+        self._addresses = {}
+        # gates being reconciled and gates changed meanwhile
+        self._running = set()
+        self._dirty = set()
+        self._loop = None
+
+    def start(self):
+        if self.interval and self._loop is None:
+            self._loop = eventlet.spawn(self._periodic)
+
+    def _periodic(self):
+        while True:
+            eventlet.sleep(self.interval)
+            try:
+                self.reconcile_all()
+            except Exception:
+                LOG.exception('Periodic key reconciliation failed')
+
+    def notify(self, gate_id, host=None):
+        """Schedule reconciliation of a gate whose keys may have changed."""
+        if host is not None:
+            self._addresses[gate_id] = host
+        if gate_id in self._running:
+            # picked up again by the running reconciliation
+            self._dirty.add(gate_id)
+            return
+        self._running.add(gate_id)
+        self._pool.spawn_n(self._worker, gate_id)
+
+    def forget(self, gate_id):
+        """Drop state of a deleted gate."""
+        self._addresses.pop(gate_id, None)
+
+    def record_appended(self, ctx, gate_id, key_ids):
+        """Record keys appended to a gate VM by a successful push.
+
+        The gate is only known to be in sync if it was before the push.
+
+        :param key_ids: ids of the appended keys, already stored in DB
+        """
+        keys = key_obj.Key.get_all_by_args(ctx, gate_id)
+        before = fingerprint(key.content for key in keys
+                             if key.id not in key_ids)
+        gate_obj.Gate.set_keys_fingerprint(
+            ctx, gate_id, fingerprint(key.content for key in keys),
+            expected=before)
+
+    def reconcile_all(self):
+        ctx = context.get_admin_context()
+        for gate in gate_obj.Gate.get_all(ctx, fields=['status']):
+            if gate.status not in (provision.GATE_BUILDING,
+                                   provision.GATE_ERROR):
+                self.notify(gate.id)
+
+    def _worker(self, gate_id):
+        try:
+            while True:
+                self._dirty.discard(gate_id)
+                try:
+                    self._reconcile(gate_id)
+                except Exception:
+                    LOG.exception('Failed to reconcile keys of gate %s' %
+                                  gate_id)
+                if gate_id not in self._dirty:
+                    break
+        finally:
+            self._running.discard(gate_id)
+
+    def _reconcile(self, gate_id):
+        # every reconciliation uses its own DB session
+        ctx = context.get_admin_context()
+        try:
+            gate = gate_obj.Gate.get_by_id(ctx, gate_id)
+        except exception.NotFound:
+            self.forget(gate_id)
+            return
+        keys = key_obj.Key.get_all_by_args(ctx, gate_id)
+
+        mgmt_key = provision.MGMT_KEY_PREFIX + gate.name
+        if not any(key.name == mgmt_key for key in keys):
+            # never sync a key set which would lock knob out of the gate
+            LOG.warning('Management key of gate %s is missing, keys are '
+                        'not reconciled' % gate_id)
+            return
+
+        contents = [key.content for key in keys]
+        desired = fingerprint(contents)
+        if gate.keys_fingerprint == desired:
+            return
+
+        host = gate.floating_ip or self._addresses.get(gate_id)
+        if host is None:
+            LOG.debug('Address of gate %s is not known yet' % gate_id)
+            return
+
+        config = {
+            'private_key_file': provision.KEY_STORE_PATH + mgmt_key,
+            'username': cfg.CONF.gate.user,
+            'host': host,
+            'host_key': gate.host_key_fingerprint,
+            'keys': contents
+            }
+        statuz = engine.sync_keys(config)
+        if statuz in engine.FAILURES:
+            LOG.warning('Failed to sync keys of gate %s: %s' %
+                        (gate_id, statuz))
+            if statuz in engine.CONNECT_FAILURES and gate.server_id:
+                # address of the gate may have changed, see refresh
+                nova.invalidate_addresses(gate.server_id)
+            return
+        gate_obj.Gate.set_keys_fingerprint(ctx, gate_id, desired)
+        LOG.info('Keys of gate %s are in sync' % gate_id)
+
+
+_reconciler = None
+
+
+def get_reconciler():
+    """Return key reconciler of the current API worker process.
+
+    The reconciler is started by every worker at startup, see
+    knob.cmd.boot.start_worker.
+    """
+    global _reconciler
+    if _reconciler is None:
+        _reconciler = KeyReconciler(cfg.CONF.gate.key_sync_interval,
+                                    cfg.CONF.gate.deploy_workers)
+        _reconciler.start()
+    return _reconciler
@@ -0,0 +1,198 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Pool of authenticated SSH connections to gate VMs.
+
+Key changes against the same gate reuse one transport and only open a
+new channel per command instead of doing a full handshake and key
+authentication every time.
+"""
+
+import base64
+import collections
+import hashlib
+import socket
+import threading
+import time
+
+from oslo_config import cfg
+from oslo_log import log as logging
+import paramiko
+
+LOG = logging.getLogger(__name__)
+
+cfg.CONF.import_group('gate', 'knob.common.config')
+
+SSH_PORT = 22
+TIMEOUT_SECONDS = 3
+
+
+def fingerprint(ssh_client):
+    """Return OpenSSH style SHA256 fingerprint of the remote host key."""
+    key = ssh_client.get_transport().get_remote_server_key()
+    digest = hashlib.sha256(key.asbytes()).digest()
+    return 'SHA256:' + base64.b64encode(digest).decode('ascii').rstrip('=')
+
+
+class SSHConnectionPool(object):
+    """LRU pool of SSH clients keyed by (host, username, key file)."""
+
+    def __init__(self, maxsize, idle_timeout, keepalive):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        # key -> [ssh_client, last_used], least recently used first
+        self._clients = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _is_alive(ssh_client):
+        transport = ssh_client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def _connect(self, host, username, key_file):
+        LOG.debug('Opening SSH connection to %s@%s' % (username, host))
+        ssh_client = paramiko.SSHClient()
+        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh_client.connect(
+            host,
+            username=username,
+            key_filename=key_file,
+            port=SSH_PORT,
+            timeout=TIMEOUT_SECONDS)
+        if self.keepalive:
+            ssh_client.get_transport().set_keepalive(self.keepalive)
+        return ssh_client
+
+    def _evict(self, now):
+        """Pop idle and overflowing clients, must be called locked."""
+        evicted = []
+        for key, (ssh_client, last_used) in list(self._clients.items()):
+            if self.idle_timeout and now - last_used > self.idle_timeout:
+                evicted.append(ssh_client)
+                del self._clients[key]
+        while len(self._clients) > self.maxsize:
+            evicted.append(self._clients.popitem(last=False)[1][0])
+        return evicted
+
+    def _touch(self, key, now):
+        """Mark client as recently used, must be called locked."""
+        entry = self._clients.pop(key, None)
+        if entry is not None:
+            entry[1] = now
+            self._clients[key] = entry
+        return entry
+
+    def get(self, host, username, key_file, host_key=None):
+        """Return connected SSH client, reconnecting when needed.
+
+        Clients are shared, paramiko multiplexes concurrent commands as
+        separate channels over the same transport.
+
+        :param host_key: expected fingerprint of the host key, the client
+                         is not returned if the host presents another key
+        """
+        ssh_client = self._get(host, username, key_file)
+        if host_key is not None and fingerprint(ssh_client) != host_key:
+            self.discard(host, username, key_file)
+            raise paramiko.SSHException('Host key of %s does not match %s' %
+                                        (host, host_key))
+        return ssh_client
+
+    def _get(self, host, username, key_file):
+        key = (host, username, key_file)
+        now = time.time()
+        with self._lock:
+            entry = self._touch(key, now)
+            stale = self._evict(now)
+        for ssh_client in stale:
+            ssh_client.close()
+        if entry is not None and self._is_alive(entry[0]):
+            return entry[0]
+
+        ssh_client = self._connect(host, username, key_file)
+        stale = []
+        with self._lock:
+            current = self._touch(key, now)
+            if (current is not None and current is not entry and
+                    self._is_alive(current[0])):
+                # connected concurrently by somebody else, share theirs
+                stale.append(ssh_client)
+                ssh_client = current[0]
+            else:
+                if current is not None:
+                    stale.append(current[0])
+                self._clients[key] = [ssh_client, now]
+                stale.extend(self._evict(now))
+        for client in stale:
+            client.close()
+        return ssh_client
+
+    def discard(self, host, username, key_file):
+        """Close connection, e.g. after a failure on it."""
+        with self._lock:
+            entry = self._clients.pop((host, username, key_file), None)
+        if entry is not None:
+            entry[0].close()
+
+    def exec_command(self, host, username, key_file, cmd, stdin_data=None,
+                     host_key=None):
+        """Run command on host and return (exit status, stdout, stderr).
+
+        :param stdin_data: optional data fed to the command input
+        :param host_key: expected fingerprint of the host key
+
+        A command failing on a reused connection is retried once on a
+        fresh connection, the remote end may have dropped it silently.
+        """
+        for attempt in (1, 2):
+            ssh_client = self.get(host, username, key_file, host_key)
+            try:
+                stdin, stdout, stderr = ssh_client.exec_command(cmd)
+                if stdin_data is not None:
+                    stdin.write(stdin_data)
+                    stdin.flush()
+                stdin.channel.shutdown_write()
+                status = stdout.channel.recv_exit_status()
+                return status, stdout.read().strip(), stderr.read().strip()
+            except (paramiko.SSHException, socket.error):
+                self.discard(host, username, key_file)
+                if attempt == 2:
+                    raise
+                LOG.debug('SSH connection to %s is broken, reconnecting' %
+                          host)
+
+    def host_key_fingerprint(self, host, username, key_file):
+        """Return fingerprint of the host key presented on a new connection."""
+        self.discard(host, username, key_file)
+        return fingerprint(self.get(host, username, key_file))
+
+    def close(self):
+        with self._lock:
+            clients = [entry[0] for entry in self._clients.values()]
+            self._clients.clear()
+        for ssh_client in clients:
+            ssh_client.close()
+
+
+_pool = None
+
+
+def get_pool():
+    """Return SSH connection pool of the current API worker process."""
+    global _pool
+    if _pool is None:
+        _pool = SSHConnectionPool(cfg.CONF.gate.ssh_pool_size,
+                                  cfg.CONF.gate.ssh_idle_timeout,
+                                  cfg.CONF.gate.ssh_keepalive_interval)
+    return _pool
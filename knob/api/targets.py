@@ -14,7 +14,11 @@
 from webob import exc
 from oslo_config import cfg
 from oslo_log import log as logging
+import six
 #from knob.api.openstack.v1 import util
+from knob.api import config_cache
+from knob.api import provision
+from knob.clients import nova
 from knob.common import serializers
 from knob.common import wsgi
 from knob.common import exception
@@ -39,6 +43,18 @@ class TargetController(object):
     
     
     def format_config(self, data):
+        return self._render_config(*self._config_inputs(data))
+
+    @staticmethod
+    def _config_inputs(data):
+        """Return tuple of all the values a stanza is rendered from."""
+        return (data['target_name'], data['target_ip'], data['user'],
+                data['target_key_file'], data['gate_key_file'],
+                cfg.CONF.gate.user, data['gate_ip'])
+
+    @staticmethod
+    def _render_config(target_name, target_ip, user, target_key_file,
+                       gate_key_file, gate_user, gate_ip):
         config = """
 Host %s
   HostName %s
@@ -49,17 +65,95 @@ Host %s
   UserKnownHostsFile=/dev/null
   ProxyCommand ssh -i %s -o StrictHostKeyChecking=no %s@%s nc %%h %%p
   """ % (
-            data['target_name'],
-            data['target_ip'],
-            data['user'],
-            data['target_key_file'],
-            data['gate_key_file'],
-            cfg.CONF.gate.user,
-            data['gate_ip'],
-            
+            target_name,
+            target_ip,
+            user,
+            target_key_file,
+            gate_key_file,
+            gate_user,
+            gate_ip,
             )
         return config
     
+    def _resolve_addresses(self, ctx, rows):
+        """Load addresses of all the targets and gates by one Nova call."""
+        server_ids = set()
+        for target, gate in rows:
+            if nova.cached_ip(target.server_id, 'private', 4, 'fixed') is None:
+                server_ids.add(target.server_id)
+            if not gate.floating_ip and gate.server_id:
+                server_ids.add(gate.server_id)
+        for server in ctx.get_servers(server_ids).values():
+            nova.cache_addresses(server)
+
+    @staticmethod
+    def _check_modified(req, etag):
+        if etag in req.if_none_match:
+            raise exc.HTTPNotModified(headers={'ETag': '"%s"' % etag})
+
+    def _generation(self, ctx, gate_id):
+        return config_cache.generation(
+            gate_obj.Gate.get_config_generations(ctx, gate_id))
+
+    def ssh_config(self, req, gate_id=None):
+        """Render ssh_config for all targets of a gate, or of the tenant.
+
+        Query parameters ``user``, ``gate_key_file`` and
+        ``target_key_file`` are required. Targets and their addresses
+        are read before the response starts, so DB and Nova failures
+        still turn into error responses, the stanzas themselves are
+        rendered one by one while the body is sent. The config is tagged
+        by its generation and a digest of the stanza inputs, a request
+        whose If-None-Match lists the tag gets 304 Not Modified.
+        """
+        data = dict((k, req.params.get(k)) for k in (
+            'user', 'gate_key_file', 'target_key_file'))
+        if not all(data.values()):
+            raise exc.HTTPBadRequest('Not supplied required parameter')
+
+        ctx = req.context
+        generation = self._generation(ctx, gate_id)
+        # tags are only cached after the scoped lookups below succeeded,
+        # so a hit is visible to the tenant as well
+        key = (ctx.tenant_id, ctx.is_admin, gate_id, data['user'],
+               data['gate_key_file'], data['target_key_file'],
+               cfg.CONF.gate.user, generation)
+        etag = config_cache.get(key)
+        if etag is not None:
+            self._check_modified(req, etag)
+
+        inputs = self._collect_inputs(ctx, data, gate_id)
+        etag = config_cache.store(key, config_cache.etag(generation, inputs))
+        self._check_modified(req, etag)
+        return config_cache.Config(
+            etag, (self._render_config(*values) for values in inputs))
+
+    def _collect_inputs(self, ctx, data, gate_id):
+        if gate_id is not None:
+            # gate must be visible to the tenant
+            gate_obj.Gate.get_by_id(ctx, gate_id)
+        rows = target_obj.Target.get_all_with_gates(ctx, gate_id)
+        self._resolve_addresses(ctx, rows)
+
+        # everything which may fail is done before the response starts,
+        # only the small per stanza input tuples are kept
+        inputs = []
+        for target, gate in rows:
+            target_ip = nova.cached_ip(target.server_id, 'private', 4,
+                                       'fixed')
+            try:
+                gate_ip = provision.gate_address(ctx, gate)
+            except exception.EntityNotFound:
+                gate_ip = None
+            if target_ip is None or gate_ip is None:
+                LOG.warning(_LW("Address of target %(name)s is unknown"),
+                            {'name': target.name})
+                continue
+            inputs.append(self._config_inputs(dict(
+                data, target_name=target.name, target_ip=target_ip,
+                gate_ip=gate_ip)))
+        return inputs
+
     def generate_config(self, req, body):
         """generate config for given target and gate"""
         
@@ -68,13 +162,28 @@ Host %s
             'target_id', 'target_key_file'))
  
         ctx = req.context
+        generation = self._generation(ctx, data['gate_id'])
+        key = (ctx.tenant_id, ctx.is_admin, 'target', data['target_id'],
+               data['gate_id'], data['user'], data['gate_key_file'],
+               data['target_key_file'], cfg.CONF.gate.user, generation)
+        etag = config_cache.get(key)
+        if etag is not None:
+            self._check_modified(req, etag)
+
         try:
-            target_ip = ctx.nova_client.get_ip(data['target_id'], 'private', 4, 'fixed')
-            target_ref = target_obj.Target.get_by_id(ctx, data['target_id'])
-        
             gate_ref = gate_obj.Gate.get_by_id(ctx, data['gate_id'])
-            server_id = gate_ref['server_id']
-            gate_ip = ctx.nova_client.get_ip(server_id, 'private', 4, 'floating')
+            target_ref = target_obj.Target.get_by_id(ctx, data['target_id'])
+            # targets are only visible through the scoped gate they are in
+            if target_ref['gate_id'] != gate_ref['id']:
+                raise exception.EntityNotFound(entity='Target',
+                                               name=data['target_id'])
+            server_ids = [data['target_id']]
+            if not gate_ref['floating_ip']:
+                server_ids.append(gate_ref['server_id'])
+            # servers are fetched by a single Nova call
+            ctx.get_servers(server_ids)
+            target_ip = ctx.get_ip(data['target_id'], 'private', 4, 'fixed')
+            gate_ip = provision.gate_address(ctx, gate_ref)
             # complete data collection with info from objects
             data['target_ip'] = target_ip
             data['target_name'] = target_ref['name']
@@ -85,15 +194,35 @@ Host %s
                         {'name': exc.name})
             return None
         
-        config = self.format_config(data)
-        
-        return {'config': config}
+        inputs = self._config_inputs(data)
+        etag = config_cache.store(key, config_cache.etag(generation,
+                                                         [inputs]))
+        self._check_modified(req, etag)
+        return config_cache.Config(etag, self._render_config(*inputs))
 
     
 
+class TargetSerializer(serializers.JSONResponseSerializer):
+    """Serializer for SSH targets responses."""
+
+    def ssh_config(self, response, result):
+        # stanzas are rendered while the body is sent
+        response.content_type = 'text/plain'
+        response.charset = 'utf-8'
+        response.etag = result.etag
+        response.app_iter = (six.text_type(chunk).encode('utf-8')
+                             for chunk in result.stanzas)
+
+    def generate_config(self, response, result):
+        if result is None:
+            return self.default(response, result)
+        self.default(response, {'config': result.stanzas})
+        response.etag = result.etag
+
+
 def create_resource(options):
     """SSH targets resource factory method."""
     deserializer = wsgi.JSONRequestDeserializer()
-    serializer = serializers.JSONResponseSerializer()
+    serializer = TargetSerializer()
     return wsgi.Resource(
         TargetController(options), deserializer, serializer)
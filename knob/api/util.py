@@ -0,0 +1,138 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_config import cfg
+from oslo_utils import timeutils
+from webob import exc
+
+from knob.common.i18n import _
+
+cfg.CONF.import_group('gate', 'knob.common.config')
+
+PARAM_TYPE_SINGLE = 'single'
+PARAM_TYPE_MULTI = 'multi'
+PARAM_TYPE_MIXED = 'mixed'
+
+PARAM_TYPES = (
+    PARAM_TYPE_SINGLE, PARAM_TYPE_MULTI, PARAM_TYPE_MIXED
+)
+
+# parameters common to all the list calls
+PAGINATION_PARAMS = {
+    'limit': PARAM_TYPE_SINGLE,
+    'marker': PARAM_TYPE_SINGLE,
+    'sort_dir': PARAM_TYPE_SINGLE,
+    'sort_keys': PARAM_TYPE_MULTI,
+    'fields': PARAM_TYPE_MULTI,
+}
+
+SORT_DIRS = ('asc', 'desc')
+
+# created_at range filters, pushed down to DB as comparisons
+CREATED_SINCE = 'created_since'
+CREATED_BEFORE = 'created_before'
+
+
+def get_allowed_params(params, whitelist):
+    """Extract from ``params`` all entries listed in ``whitelist``.
+
+    The returning dict will contain an entry for a key if, and only if,
+    there's an entry in ``whitelist`` for that key and at least one entry in
+    ``params``. If ``params`` contains multiple entries for the same key, it
+    will yield an array of values: ``{key: [v1, v2,...]}``
+
+    :param params: a NestedMultiDict from webob.Request.params
+    :param whitelist: an array of strings to whitelist
+
+    :returns: a dict with {key: value} pairs
+    """
+    allowed_params = {}
+
+    for key, get_type in whitelist.items():
+        assert get_type in PARAM_TYPES
+
+        value = None
+        if get_type == PARAM_TYPE_SINGLE:
+            value = params.get(key)
+        elif get_type == PARAM_TYPE_MULTI:
+            value = params.getall(key)
+        elif get_type == PARAM_TYPE_MIXED:
+            value = params.getall(key)
+            if isinstance(value, list) and len(value) == 1:
+                value = value.pop()
+
+        if value:
+            allowed_params[key] = value
+
+    return allowed_params
+
+
+def _split(values):
+    # both ?fields=a&fields=b and ?fields=a,b are accepted
+    result = []
+    for value in values:
+        result.extend(v.strip() for v in value.split(',') if v.strip())
+    return result
+
+
+def get_list_params(req, filter_whitelist, columns):
+    """Parse pagination, sorting, filtering and sparse fieldset parameters.
+
+    :param req: the list request
+    :param filter_whitelist: dict of filter name -> PARAM_TYPE_*
+    :param columns: names of the columns which may be sorted by or selected
+    :returns: dict of keyword arguments of the object get_all() calls
+
+    Every page is bounded, the limit defaults to list_default_limit and
+    is lowered to list_max_limit.
+    """
+    params = get_allowed_params(req.params, PAGINATION_PARAMS)
+    result = {}
+
+    limit = cfg.CONF.gate.list_default_limit
+    if 'limit' in params:
+        try:
+            limit = int(params['limit'])
+        except ValueError:
+            raise exc.HTTPBadRequest(_('Invalid limit: %s') % params['limit'])
+        if limit < 0:
+            raise exc.HTTPBadRequest(_('Invalid limit: %s') % params['limit'])
+    result['limit'] = min(limit, cfg.CONF.gate.list_max_limit)
+    if 'marker' in params:
+        result['marker'] = params['marker']
+    if 'sort_dir' in params:
+        if params['sort_dir'] not in SORT_DIRS:
+            raise exc.HTTPBadRequest(_('Invalid sort direction: %s') %
+                                     params['sort_dir'])
+        result['sort_dir'] = params['sort_dir']
+
+    for name in ('sort_keys', 'fields'):
+        values = _split(params.get(name, []))
+        invalid = [v for v in values if v not in columns]
+        if invalid:
+            raise exc.HTTPBadRequest(_('Invalid %(name)s: %(values)s') % {
+                'name': name, 'values': ', '.join(invalid)})
+        if values:
+            result[name] = values
+
+    filters = get_allowed_params(req.params, filter_whitelist)
+    for name in (CREATED_SINCE, CREATED_BEFORE):
+        if name in filters:
+            try:
+                filters[name] = timeutils.parse_isotime(filters[name])
+            except ValueError:
+                raise exc.HTTPBadRequest(_('Invalid %(name)s: %(value)s') % {
+                    'name': name, 'value': filters[name]})
+    if filters:
+        result['filters'] = filters
+    return result
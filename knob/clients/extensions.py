@@ -0,0 +1,65 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Process wide registry of API extensions supported by service endpoints.
+
+Extension sets only change on cloud upgrades, so they are fetched once
+per endpoint and refreshed on a long TTL.
+"""
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from knob.common import cache
+
+LOG = logging.getLogger(__name__)
+
+cfg.CONF.import_opt('extension_cache_ttl', 'knob.common.config')
+
+# endpoints known to a single API worker
+MAX_ENDPOINTS = 64
+
+_extensions = None
+
+
+def _get_cache():
+    global _extensions
+    if _extensions is None:
+        _extensions = cache.TTLCache(MAX_ENDPOINTS,
+                                     cfg.CONF.extension_cache_ttl)
+    return _extensions
+
+
+def get_extensions(endpoint, fetch):
+    """Return set of extension aliases supported by an endpoint.
+
+    :param endpoint: URL of the service endpoint
+    :param fetch: called to list the aliases when they are not known
+    """
+    def load():
+        LOG.debug('Loading extensions of %s' % endpoint)
+        return frozenset(fetch())
+    return _get_cache().get_or_create(endpoint, load)
+
+
+def has_extension(endpoint, alias, fetch):
+    """Check if an endpoint supports the extension."""
+    return alias in get_extensions(endpoint, fetch)
+
+
+def invalidate(endpoint=None):
+    """Forget extensions of an endpoint, all of them if not given."""
+    if endpoint is None:
+        _get_cache().clear()
+    else:
+        _get_cache().pop(endpoint)
@@ -13,19 +13,45 @@
 
 from neutronclient.common import exceptions
 from neutronclient.neutron import client as neutron_client
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import uuidutils
 
+from knob.clients import extensions
+from knob.common import cache
 from knob.common import exception
 
 LOG = logging.getLogger(__name__)
 
+cfg.CONF.import_opt('secgroup_cache_size', 'knob.common.config')
+cfg.CONF.import_opt('secgroup_cache_ttl', 'knob.common.config')
+
+_secgroups = None
+
+
+def _secgroup_cache():
+    """Return cache of security group state known to be in place.
+
+    Keys are tagged tuples:
+      ('group', project_id, name) -> security group id
+      ('cidr', network_id) -> CIDR of the network's first subnet
+      ('rule', project_id, group_id, cidr) -> True, SSH rule exists
+      ('names', project_id, name) -> list of (group id, owner tenant id)
+                                    of the groups visible to the project
+    """
+    global _secgroups
+    if _secgroups is None:
+        _secgroups = cache.TTLCache(cfg.CONF.secgroup_cache_size,
+                                    cfg.CONF.secgroup_cache_ttl)
+    return _secgroups
+
 
 class NeutronClient(object):
 
 
     def __init__(self, session):
         self._client = neutron_client.Client('2.0', session=session)
+        self._session = session
     
     def client(self):
         if self._client is None:
@@ -42,14 +68,16 @@ class NeutronClient(object):
         return port_id
     
     def associate_fip(self, port_id, public_net_id):
-        """create fip and associate with given port_id """
+        """create fip and associate with given port_id
+
+        :returns: the floating ip, with its id and both addresses
+        """
         request = {'floatingip': 
                    {'floating_network_id': public_net_id,
                     'port_id': port_id}
                    }
         response = self.client().create_floatingip(request)
-        fip_id = response['floatingip']['id']
-        return fip_id
+        return response['floatingip']
     
     def disassociate_fip(self, fip_id):
         """delete fip and attached port """
@@ -114,12 +142,14 @@ class NeutronClient(object):
             self.client(), resource, name_or_id, cmd_resource=cmd_resource)
 
     def _list_extensions(self):
-        extensions = self.client().list_extensions().get('extensions')
-        return set(extension.get('alias') for extension in extensions)
+        aliases = self.client().list_extensions().get('extensions')
+        return set(extension.get('alias') for extension in aliases)
 
     def has_extension(self, alias):
         """Check if specific extension is present."""
-        return alias in self._list_extensions()
+        endpoint = self._session.get_endpoint(service_type='network')
+        return extensions.has_extension(endpoint, alias,
+                                        self._list_extensions)
 
     def _resolve(self, props, key, id_key, key_type):
         if props.get(key):
@@ -157,23 +187,51 @@ class NeutronClient(object):
         return self.find_resourceid_by_name_or_id(
             'policy', policy, cmd_resource='qos_policy')
 
+    def _index_secgroups(self, project_id, names):
+        """Return dict of name -> [(id, tenant_id)] of security groups.
+
+        Groups are looked up per name in a per project index, names missing
+        from it are all fetched by a single filtered list call.
+        """
+        secgroups = _secgroup_cache()
+        index = {}
+        missing = []
+        for name in names:
+            groups = secgroups.get(('names', project_id, name))
+            if groups is None:
+                missing.append(name)
+            else:
+                index[name] = groups
+        if missing:
+            response = self.client().list_security_groups(
+                name=missing, fields=['id', 'name', 'tenant_id'])
+            found = dict((name, []) for name in missing)
+            for g in response['security_groups']:
+                if g['name'] in found:
+                    found[g['name']].append((g['id'], g['tenant_id']))
+            for name, groups in found.items():
+                # unknown names are not cached, they may be created soon
+                if groups:
+                    secgroups.set(('names', project_id, name), groups)
+            index.update(found)
+        return index
+
     def get_secgroup_uuids(self, security_groups):
         '''Returns a list of security group UUIDs.
 
         Args:
         security_groups: List of security group names or UUIDs
         '''
+        project_id = self._session.get_project_id()
+        names = [sg for sg in security_groups
+                 if not uuidutils.is_uuid_like(sg)]
+        index = self._index_secgroups(project_id, names) if names else {}
         seclist = []
-        all_groups = None
         for sg in security_groups:
             if uuidutils.is_uuid_like(sg):
                 seclist.append(sg)
             else:
-                if not all_groups:
-                    response = self.client().list_security_groups()
-                    all_groups = response['security_groups']
-                same_name_groups = [g for g in all_groups if g['name'] == sg]
-                groups = [g['id'] for g in same_name_groups]
+                groups = [g[0] for g in index[sg]]
                 if len(groups) == 0:
                     raise exception.EntityNotFound(entity='Resource', name=sg)
                 elif len(groups) == 1:
@@ -182,8 +240,8 @@ class NeutronClient(object):
                     # for admin roles, can get the other users'
                     # securityGroups, so we should match the tenant_id with
                     # the groups, and return the own one
-                    own_groups = [g['id'] for g in same_name_groups
-                                  if g['tenant_id'] == self.context.tenant_id]
+                    own_groups = [g[0] for g in index[sg]
+                                  if g[1] == project_id]
                     if len(own_groups) == 1:
                         seclist.append(own_groups[0])
                     else:
@@ -191,14 +249,33 @@ class NeutronClient(object):
         return seclist
 
     def update_security_groups(self, project_id, security_group, public_net_id):
-        group=self.client().list_security_groups(project_id=project_id, 
-                                                      name=security_group,
-                                                      fields="id")
-        group_id=group['security_groups'][0]['id']
-        LOG.info('Found \'%s\' security group with group id: %s' % (security_group, group_id))
-        
-        subnet = self.client().list_subnets(network_id=public_net_id)
-        ip_prefix=subnet['subnets'][0]['cidr']
+        """Ensure SSH from the public network is allowed in the group.
+
+        Group ids, network CIDRs and rules known to exist are cached, so
+        Neutron is only contacted when that state is unknown or stale.
+        """
+        secgroups = _secgroup_cache()
+        group_key = ('group', project_id, security_group)
+        group_id = secgroups.get(group_key)
+        if group_id is None:
+            group=self.client().list_security_groups(project_id=project_id, 
+                                                          name=security_group,
+                                                          fields="id")
+            group_id=group['security_groups'][0]['id']
+            LOG.info('Found \'%s\' security group with group id: %s' % (security_group, group_id))
+            secgroups.set(group_key, group_id)
+
+        cidr_key = ('cidr', public_net_id)
+        ip_prefix = secgroups.get(cidr_key)
+        if ip_prefix is None:
+            subnet = self.client().list_subnets(network_id=public_net_id,
+                                                fields='cidr')
+            ip_prefix=subnet['subnets'][0]['cidr']
+            secgroups.set(cidr_key, ip_prefix)
+
+        rule_key = ('rule', project_id, group_id, ip_prefix)
+        if secgroups.get(rule_key):
+            return
         LOG.info('Adding new SSH ingress rule to CIDR range %s' % ip_prefix)
         try:
            req = {
@@ -216,3 +293,9 @@ class NeutronClient(object):
            LOG.debug('Rule was added succesfully')
         except exceptions.Conflict:
            LOG.debug('Rule is already exists')
+        except Exception as ex:
+           if self.is_not_found(ex):
+               # group was replaced meanwhile, look it up next time
+               secgroups.pop(group_key)
+           raise
+        secgroups.set(rule_key, True)
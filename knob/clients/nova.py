@@ -13,6 +13,7 @@
 
 import collections
 
+import eventlet
 from novaclient import client as nova_client
 from novaclient import exceptions
 from oslo_config import cfg
@@ -21,23 +22,85 @@ from oslo_serialization import jsonutils
 from oslo_utils import uuidutils
 from oslo_utils import excutils
 from retrying import retry
-import six
 from six.moves.urllib import parse as urlparse
 
 import requests
 
+from knob.clients import extensions
+from knob.clients import server_watcher
+from knob.common import cache
 from knob.common import exception
 from knob.common.i18n import _
 from knob.common.i18n import _LW
 
 LOG = logging.getLogger(__name__)
 
+cfg.CONF.import_opt('address_cache_size', 'knob.common.config')
+cfg.CONF.import_opt('address_cache_ttl', 'knob.common.config')
+cfg.CONF.import_opt('resolution_cache_size', 'knob.common.config')
+cfg.CONF.import_opt('resolution_cache_ttl', 'knob.common.config')
+cfg.CONF.import_opt('resolution_negative_ttl', 'knob.common.config')
+cfg.CONF.import_opt('server_list_threshold', 'knob.common.config')
+cfg.CONF.import_opt('server_wait_timeout', 'knob.common.config')
+cfg.CONF.import_opt('server_delete_timeout', 'knob.common.config')
+cfg.CONF.import_opt('server_poll_min_interval', 'knob.common.config')
+cfg.CONF.import_opt('server_poll_max_interval', 'knob.common.config')
 
 NOVA_API_VERSION = "2.1"
 CLIENT_NAME = 'nova'
 
 
 
+_addresses = None
+
+
+def _address_cache():
+    global _addresses
+    if _addresses is None:
+        _addresses = cache.TTLCache(cfg.CONF.address_cache_size,
+                                    cfg.CONF.address_cache_ttl)
+    return _addresses
+
+
+def cache_addresses(server):
+    """Remember all the IP addresses of a server object."""
+    addresses = _address_cache()
+    seen = set()
+    for net_type, ips in server.addresses.items():
+        for ip in ips:
+            key = (server.id, net_type, ip['version'],
+                   ip.get('OS-EXT-IPS:type'))
+            # the first address of a kind wins, like in server_ip()
+            if key not in seen:
+                seen.add(key)
+                addresses.set(key, ip['addr'])
+
+
+def cached_ip(server_id, net_type, ip_version, extended_type):
+    """Return cached IP address of a server or None."""
+    return _address_cache().get(
+        (server_id, net_type, ip_version, extended_type))
+
+
+def invalidate_addresses(server_id=None):
+    """Forget cached addresses of a server, all of them if not given."""
+    _address_cache().invalidate_if(
+        lambda key: server_id is None or key[0] == server_id)
+
+
+_resolutions = None
+# cached in place of ids of resources which do not exist
+_NOT_FOUND = object()
+
+
+def _resolution_cache():
+    global _resolutions
+    if _resolutions is None:
+        _resolutions = cache.TTLCache(cfg.CONF.resolution_cache_size,
+                                      cfg.CONF.resolution_cache_ttl)
+    return _resolutions
+
+
 def retry_if_connection_err(exception):
     return isinstance(exception, requests.ConnectionError)
 
@@ -63,34 +126,111 @@ class NovaClient(object):
 
     def __init__(self, sess):
         self._client = nova_client.Client(NOVA_API_VERSION, session=sess)
+        self._session = sess
+        self._watcher = None
     
     def client(self):
         if self._client is None:
             raise exception.NotFound('nova object not found')
         return self._client
 
+    def watcher(self):
+        """Return the server watcher shared by waiters of this tenant."""
+        if self._watcher is None:
+            self._watcher = server_watcher.ServerWatcher(
+                self.client(), self.get_servers,
+                cfg.CONF.server_poll_min_interval,
+                cfg.CONF.server_poll_max_interval)
+        return self._watcher
+
+    def _wait_server(self, server_id, check, timeout=None):
+        if timeout is None:
+            timeout = cfg.CONF.server_wait_timeout
+        done = self.watcher().wait(server_id, check, timeout)
+        if not done:
+            LOG.warning(_LW('Instance (%(server)s) did not reach the '
+                            'expected state in %(timeout)s seconds'),
+                        {'server': server_id, 'timeout': timeout})
+        return done is True
+
     def keypair_create(self, key_name):
         client = self.client()
         key = client.keypairs.create(key_name)
+        _resolution_cache().set(self._resolution_key('keypair', key_name),
+                                key.name)
         return key
     
     def keypair_delete(self, key_name):
         client = self.client()
+        _resolution_cache().pop(self._resolution_key('keypair', key_name))
         client.keypairs.delete(key_name)
 
+    def _resolution_key(self, kind, name):
+        # names are only unique within a tenant
+        return (self._session.get_project_id(), kind, name)
+
+    def _resolve(self, kind, name, find):
+        """Return id of a named resource, memoized per tenant.
+
+        :param kind: resource kind, e.g. 'flavor'
+        :param find: called with the name to look the id up in Nova
+        :raises: exception.EntityNotFound
+        """
+        resolutions = _resolution_cache()
+        key = self._resolution_key(kind, name)
+        resource_id = resolutions.get(key)
+        if resource_id is None:
+            try:
+                resource_id = find(name)
+            except exceptions.NotFound:
+                resource_id = _NOT_FOUND
+                resolutions.set(key, resource_id,
+                                cfg.CONF.resolution_negative_ttl)
+            else:
+                resolutions.set(key, resource_id)
+        if resource_id is _NOT_FOUND:
+            raise exception.EntityNotFound(entity=kind.capitalize(),
+                                           name=name)
+        return resource_id
+
+    def find_image(self, image):
+        """Return id of the image with the given name."""
+        return self._resolve(
+            'image', image,
+            lambda name: self.client().images.find(name=name).id)
+
+    def find_keypair(self, key_name):
+        """Return name of an existing keypair, it serves as its id."""
+        return self._resolve(
+            'keypair', key_name,
+            lambda name: self.client().keypairs.get(name).name)
+
     def create_service_vm(self, data):
+        server_id = self.boot_service_vm(data)
+        if server_id is None:
+            return None
+        if self.wait_service_vm(server_id):
+            return server_id
+        else:
+            return None
+
+    def boot_service_vm(self, data):
+        """Request a new gate VM, do not wait for it to become ACTIVE."""
         #nics = [{"net-id": net_id, "v4-fixed-ip": ''}]
         
         client = self.client()  
         # verify keypair
         key_name=data['key_name']
-        if client.keypairs.get(key_name) is None:
+        try:
+            self.find_keypair(key_name)
+        except exception.EntityNotFound:
             LOG.warning(_LW('Provided key with name (%(name)s)'), 
                         {'name': key_name})
             return None
         
-        image = client.images.find(name=data['image'])
-        flavor = client.flavors.find(name=data['flavor'])
+        # names are resolved once per tenant, not by listing catalogs
+        image = self.find_image(data['image'])
+        flavor = self.find_flavor_by_name_or_id(data['flavor'])
         server_ref = None
         try:
             nics = [{'port-id': data['port-id']}]
@@ -106,10 +246,16 @@ class NovaClient(object):
                 server_id = server_ref.id
             else:
                 return None
-        
+        return server_id
+
+    def wait_service_vm(self, server_id):
+        """Wait for gate VM to become ACTIVE.
+
+        :returns: True if server is ACTIVE, False otherwise
+        """
         try:
             # wait till server is ready
-            status = self._check_active(server_id)
+            status = self._wait_server(server_id, self._check_active)
             
         except exception.ResourceInError as ex:
             status = False
@@ -121,18 +267,16 @@ class NovaClient(object):
             LOG.warning(_LW('Instance (%(server)s) bad status while creating: %(ex)s'),
                         {'server': server_id, 'ex': ex})
         
-        if status is True:
-           return server_id
-        else:
-           return None
+        return status is True
     
     def remove_service_vm(self, server_id):
 
         self.client().servers.delete(server_id)
         
         try:
-            # wait till server is down
-            self.check_delete_server_complete(server_id)
+            # wait till server is down, briefly, the API request waits
+            self._wait_server(server_id, self.check_delete_server_complete,
+                              cfg.CONF.server_delete_timeout)
         except exception.ServiceNotFound as ex:
             LOG.warning(_LW('Instance (%(server)s) bad status while deleting: %(ex)s'),
                         {'server': server_id, 'ex': ex})
@@ -202,14 +346,52 @@ class NovaClient(object):
         return server
 
 
+    @retry(stop_max_attempt_number=max(cfg.CONF.client_retry_limit + 1, 0),
+           retry_on_exception=retry_if_connection_err)
+    def get_servers(self, server_ids):
+        """Return fresh server objects of many servers at once.
+
+        Small batches are fetched by concurrent servers.get calls, larger
+        ones by a single (paginated) servers.list call, which costs the
+        same however many servers of the tenant are looked up.
+
+        :param server_ids: ids of the servers to look up
+        :returns: dict of server id -> server, unknown servers are absent
+        """
+        server_ids = set(server_ids)
+        if not server_ids:
+            return {}
+        if len(server_ids) <= cfg.CONF.server_list_threshold:
+            def fetch(server_id):
+                try:
+                    return self.client().servers.get(server_id)
+                except exceptions.NotFound:
+                    return None
+            pool = eventlet.GreenPool(len(server_ids))
+            return dict((server.id, server)
+                        for server in pool.imap(fetch, server_ids)
+                        if server is not None)
+        # the uuid filter is admin only, list the servers of the tenant
+        servers = self.client().servers.list(limit=-1)
+        return dict((server.id, server) for server in servers
+                    if server.id in server_ids)
+
+    @staticmethod
+    def server_ip(server, net_type, ip_version, extended_type):
+        """Return the IP of the given type and version of a server object."""
+        for ip in server.addresses.get(net_type, []):
+            if ip['version'] == ip_version and \
+                ip['OS-EXT-IPS:type'] == extended_type:
+                return ip['addr']
+
     def get_ip(self, server_id, net_type, ip_version, extended_type):
         """Return the server's IP of the given type and version."""
-        server = self.get_server(server_id)
-        if net_type in server.addresses:
-            for ip in server.addresses[net_type]:
-                if ip['version'] == ip_version and \
-                    ip['OS-EXT-IPS:type'] == extended_type:
-                    return ip['addr']
+        ip = cached_ip(server_id, net_type, ip_version, extended_type)
+        if ip is None:
+            server = self.get_server(server_id)
+            cache_addresses(server)
+            ip = self.server_ip(server, net_type, ip_version, extended_type)
+        return ip
 
     def get_status(self, server):
         """Return the server's status.
@@ -220,13 +402,10 @@ class NovaClient(object):
         # Some clouds append extra (STATUS) strings to the status, strip it
         return server.status.split('(')[0]
 
-    @retry(stop_max_attempt_number=cfg.CONF.max_interface_check_attempts,
-           wait_fixed=500,
-           retry_on_result=retry_if_result_is_false)
     def _check_active(self, server, res_name='Server'):
         """Check server status.
 
-        Accepts both server IDs and server objects.
+        Accepts fresh server objects as handed out by the server watcher.
         Returns True if server is ACTIVE,
         raises errors when server has an ERROR or unknown to Heat status,
         returns False otherwise.
@@ -234,18 +413,9 @@ class NovaClient(object):
         :param res_name: name of the resource to use in the exception message
 
         """
-        # not checking with is_uuid_like as most tests use strings e.g. '1234'
-        if isinstance(server, six.string_types):
-            server = self.fetch_server(server)
-            if server is None:
-                return False
-            else:
-                status = self.get_status(server)
-        else:
-            status = self.get_status(server)
-            if status != 'ACTIVE':
-                self.refresh_server(server)
-                status = self.get_status(server)
+        if server is None:
+            return False
+        status = self.get_status(server)
 
         if status in self.deferred_server_statuses:
             return False
@@ -270,13 +440,8 @@ class NovaClient(object):
         :param flavor: the name of the flavor to find
         :returns: the id of :flavor:
         """
-        return self._find_flavor_id(self.context.tenant_id,
-                                    flavor)
-
-    def _find_flavor_id(self, tenant_id, flavor):
-        # tenant id in the signature is used for the memoization key,
-        # that would differentiate similar resource names across tenants.
-        return self.get_flavor(flavor).id
+        return self._resolve('flavor', flavor,
+                             lambda name: self.get_flavor(name).id)
 
     def get_flavor(self, flavor_identifier):
         """Get the flavor object for the specified flavor name or id.
@@ -318,18 +483,13 @@ class NovaClient(object):
         except exceptions.NotFound:
             raise exception.EntityNotFound(entity='Key', name=key_name)
 
-    @retry(stop_max_attempt_number=cfg.CONF.max_interface_check_attempts,
-           wait_fixed=500,
-           retry_on_result=retry_if_result_is_false)
-    def check_delete_server_complete(self, server_id):
-        """Wait for server to disappear from Nova."""
-        try:
-            server = self.fetch_server(server_id)
-        except Exception as exc:
-            self.ignore_not_found(exc)
+    def check_delete_server_complete(self, server):
+        """Check whether server has disappeared from Nova.
+
+        :param server: fresh server object, None if it is not listed
+        """
+        if server is None:
             return True
-        if not server:
-            return False
         task_state_in_nova = getattr(server, 'OS-EXT-STS:task_state', None)
         # the status of server won't change until the delete task has done
         if task_state_in_nova == 'deleting':
@@ -416,10 +576,12 @@ class NovaClient(object):
         return False
 
     def _list_extensions(self):
-        extensions = self.client().list_extensions.show_all()
-        return set(extension.alias for extension in extensions)
+        aliases = self.client().list_extensions.show_all()
+        return set(extension.alias for extension in aliases)
 
     def has_extension(self, alias):
         """Check if specific extension is present."""
-        return alias in self._list_extensions()
+        endpoint = self._session.get_endpoint(service_type='compute')
+        return extensions.has_extension(endpoint, alias,
+                                        self._list_extensions)
 
@@ -0,0 +1,84 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Per-process pool of OpenStack service clients.
+
+Clients are bound to the cached keystone session of a tenant and shared
+by all the requests of that tenant, so version and extension discovery
+happens once per client instead of once per request.
+"""
+
+from keystoneclient.v3 import client as keystone_client
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from knob.clients import barbican
+from knob.clients import neutron
+from knob.clients import nova
+from knob.common import cache
+
+LOG = logging.getLogger(__name__)
+
+cfg.CONF.import_opt('client_pool_size', 'knob.common.config')
+cfg.CONF.import_opt('client_idle_timeout', 'knob.common.config')
+
+
+def _keystone_factory(sess):
+    return keystone_client.Client(session=sess)
+
+
+CLIENT_FACTORIES = {
+    'barbican': barbican.BarbicanClient,
+    'keystone': _keystone_factory,
+    'neutron': neutron.NeutronClient,
+    'nova': nova.NovaClient,
+}
+
+
+class ClientPool(object):
+    """Bounded pool of ready to use clients with idle eviction."""
+
+    def __init__(self, maxsize, idle_timeout):
+        # (service, scope) -> (session, client)
+        self._clients = cache.TTLCache(maxsize, idle_timeout)
+
+    def get(self, service, scope, sess):
+        """Return client of the service bound to the given session.
+
+        :param service: one of CLIENT_FACTORIES keys
+        :param scope: hashable key identifying the session owner
+        :param sess: keystone session of the scope
+        """
+        key = (service, scope)
+        entry = self._clients.get(key)
+        if entry is None or entry[0] is not sess:
+            # first use or session of the scope was replaced
+            LOG.debug('Creating %s client for %s' % (service, scope))
+            entry = (sess, CLIENT_FACTORIES[service](sess))
+        # reset idle timer on every use
+        self._clients.set(key, entry)
+        return entry[1]
+
+    def clear(self):
+        self._clients.clear()
+
+
+_pool = None
+
+
+def get_client(service, scope, sess):
+    global _pool
+    if _pool is None:
+        _pool = ClientPool(cfg.CONF.client_pool_size,
+                           cfg.CONF.client_idle_timeout)
+    return _pool.get(service, scope, sess)
@@ -0,0 +1,144 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Multiplexed waiting for Nova servers to reach a state.
+
+Instead of every waiter polling its own server, a single green thread
+per tenant lists the servers changed since its previous sweep and hands
+them to the waiters. Servers newly waited for are looked up once by id.
+The sweep interval backs off while nothing changes and is jittered, so
+many tenants waiting at once do not poll in step.
+"""
+
+import datetime
+import random
+import sys
+import time
+
+import eventlet
+from eventlet import event
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# changes-since is compared with the Nova clock, tolerate some skew
+CLOCK_SKEW = 30
+JITTER = 0.2
+
+
+class ServerWatcher(object):
+    """Wakes waiters when the servers they wait for change.
+
+    :param client: novaclient client listing servers of the tenant
+    :param get_servers: returns dict of server id -> server of the given
+                        ids, servers absent from it are known not to exist
+    :param min_interval: seconds between sweeps while servers change
+    :param max_interval: upper bound of the sweep interval back off
+    """
+
+    def __init__(self, client, get_servers, min_interval, max_interval):
+        self._client = client
+        self._get_servers = get_servers
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        # server_id -> list of (check, event)
+        self._waiters = {}
+        # servers whose current state was not seen by a sweep yet
+        self._new = set()
+        self._since = None
+        self._interval = min_interval
+        self._loop = None
+
+    def wait(self, server_id, check, timeout):
+        """Wait for check(server) to return True.
+
+        :param check: called with every fresh server object, or None if
+                      the server was not found, returns True
+                      when done, False to go on waiting, exceptions are
+                      re-raised to the waiter
+        :returns: True, or None if timed out
+        """
+        done = event.Event()
+        waiter = (check, done)
+        self._waiters.setdefault(server_id, []).append(waiter)
+        self._new.add(server_id)
+        self._interval = self.min_interval
+        if self._loop is None:
+            self._loop = eventlet.spawn(self._run)
+        try:
+            with eventlet.Timeout(timeout, False):
+                return done.wait()
+        finally:
+            waiters = self._waiters.get(server_id, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters:
+                self._waiters.pop(server_id, None)
+
+    def _run(self):
+        try:
+            while self._waiters:
+                try:
+                    resolved = self._sweep()
+                except Exception:
+                    LOG.exception('Failed to list servers')
+                    resolved = False
+                if resolved:
+                    self._interval = self.min_interval
+                else:
+                    self._interval = min(self._interval * 2,
+                                         self.max_interval)
+                eventlet.sleep(self._interval *
+                               random.uniform(1 - JITTER, 1 + JITTER))
+        finally:
+            self._loop = None
+
+    def _sweep(self):
+        started = time.time()
+        pending = set(self._waiters)
+        new = set(self._new)
+        resolved = False
+        if new:
+            # current state of servers not seen yet, absent ones are gone
+            found = self._get_servers(new)
+            for server_id in new.intersection(pending):
+                resolved = (self._notify(server_id, found.get(server_id)) or
+                            resolved)
+            pending.difference_update(new)
+            self._new.difference_update(new)
+        if pending and self._since is not None:
+            # deleted servers are listed too when changes-since is given
+            since = datetime.datetime.utcfromtimestamp(
+                self._since - CLOCK_SKEW)
+            servers = self._client.servers.list(
+                search_opts={'changes-since': since.isoformat()}, limit=-1)
+            for server in servers:
+                if server.id in pending:
+                    pending.discard(server.id)
+                    resolved = self._notify(server.id, server) or resolved
+        self._since = started
+        return resolved
+
+    def _notify(self, server_id, server):
+        resolved = False
+        for check, done in list(self._waiters.get(server_id, [])):
+            if done.ready():
+                continue
+            try:
+                if check(server):
+                    done.send(True)
+                    resolved = True
+            except Exception:
+                done.send_exception(*sys.exc_info())
+                resolved = True
+        return resolved
@@ -29,6 +29,8 @@ from oslo_reports import guru_meditation_report as gmr
 from oslo_service import systemd
 import six
 
+from knob.api import provision
+from knob.api import reconciler
 from knob.common import config
 from knob.common.i18n import _LI
 #from knob.common import messaging
@@ -66,6 +68,12 @@ def create_service_ref(host, binary, topic):
     if not service_ref:
         do_create_service_ref(ctxt, host, binary, topic)
             
+def start_worker():
+    """Start background tasks of an API worker process."""
+    # failed key pushes are retried without waiting for a key request
+    reconciler.get_reconciler()
+
+
 def launch_api(setup_logging=True):
     if setup_logging:
         logging.register_options(cfg.CONF)
@@ -77,6 +85,8 @@ def launch_api(setup_logging=True):
     #messaging.setup()
     create_service_ref(binary='knob-api', host=CONF.host,
                        topic='knob-api')
+    # once, before the workers are forked
+    provision.recover_builds()
     app = config.load_paste_app()
 
     port = cfg.CONF.knob_api.bind_port
@@ -85,7 +95,8 @@ def launch_api(setup_logging=True):
              {'host': host, 'port': port})
     #profiler.setup('knob-api', host)
     gmr.TextGuruMeditation.setup_autorun(version)
-    server = wsgi.Server('knob-api', cfg.CONF.knob_api)
+    server = wsgi.Server('knob-api', cfg.CONF.knob_api,
+                         on_worker_start=start_worker)
     server.start(app, default_port=port)
     return server
 
@@ -0,0 +1,102 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-process caches shared by the API worker green threads."""
+
+import collections
+import threading
+import time
+
+
+class TTLCache(object):
+    """Size bounded LRU cache with per entry expiration.
+
+    Safe to use from green threads and native threads. Values are never
+    created under the lock, so two concurrent misses may both build the
+    value, the last one wins.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (expires_at, value), least recently used first
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return default
+            # mark as recently used
+            del self._data[key]
+            self._data[key] = item
+            return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires_at, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_create(self, key, factory, ttl=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        if item is None:
+            return default
+        return item[1]
+
+    def invalidate_if(self, predicate):
+        """Drop all the entries which keys match the predicate."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def expire(self):
+        """Drop expired entries, return list of dropped values."""
+        now = time.time()
+        dropped = []
+        with self._lock:
+            for key, (expires_at, value) in list(self._data.items()):
+                if expires_at is not None and expires_at <= now:
+                    del self._data[key]
+                    dropped.append(value)
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_MISSING = object()
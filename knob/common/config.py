@@ -63,6 +63,88 @@ default_client_opts = [
                default=10,
                help=_('Number of times to check whether an interface has '
                       'been attached or detached.')),
+   cfg.IntOpt('client_pool_size',
+               min=1,
+               default=400,
+               help=_('Maximum number of service clients kept by an API '
+                      'worker, one per service and tenant.')),
+   cfg.IntOpt('client_idle_timeout',
+               min=0,
+               default=1800,
+               help=_('Number of seconds an unused service client is kept '
+                      'in the pool. 0 means until evicted by newer '
+                      'clients.')),
+   cfg.IntOpt('address_cache_size',
+               min=1,
+               default=10000,
+               help=_('Maximum number of server IP addresses kept by an '
+                      'API worker.')),
+   cfg.IntOpt('address_cache_ttl',
+               min=0,
+               default=3600,
+               help=_('Number of seconds a server IP address is trusted '
+                      'before it is looked up again.')),
+   cfg.IntOpt('resolution_cache_size',
+               min=1,
+               default=1000,
+               help=_('Maximum number of flavor, image and keypair names '
+                      'resolved to ids kept by an API worker.')),
+   cfg.IntOpt('resolution_cache_ttl',
+               min=0,
+               default=3600,
+               help=_('Number of seconds a flavor, image or keypair name '
+                      'resolved to an id is trusted.')),
+   cfg.IntOpt('resolution_negative_ttl',
+               min=1,
+               default=60,
+               help=_('Number of seconds a flavor, image or keypair name '
+                      'which was not found is not looked up again.')),
+   cfg.IntOpt('secgroup_cache_size',
+               min=1,
+               default=1000,
+               help=_('Maximum number of security groups, network CIDRs '
+                      'and security group rules known to exist kept by an '
+                      'API worker.')),
+   cfg.IntOpt('secgroup_cache_ttl',
+               min=0,
+               default=3600,
+               help=_('Number of seconds security groups and rules known '
+                      'to exist are trusted before Neutron is asked '
+                      'again.')),
+   cfg.IntOpt('extension_cache_ttl',
+               min=0,
+               default=86400,
+               help=_('Number of seconds the API extensions supported by a '
+                      'service endpoint are trusted before they are listed '
+                      'again.')),
+   cfg.IntOpt('server_list_threshold',
+               min=1,
+               default=10,
+               help=_('Number of servers above which a batch lookup lists '
+                      'all the servers of the tenant instead of fetching '
+                      'the servers one by one concurrently.')),
+   cfg.IntOpt('server_wait_timeout',
+               min=1,
+               default=300,
+               help=_('Maximum number of seconds to wait for a server to '
+                      'become active.')),
+   cfg.IntOpt('server_delete_timeout',
+               min=0,
+               default=5,
+               help=_('Maximum number of seconds a gate delete request '
+                      'waits for its server to disappear, Nova completes '
+                      'the deletion in background anyway.')),
+   cfg.FloatOpt('server_poll_min_interval',
+                 min=0.1,
+                 default=1.0,
+                 help=_('Interval in seconds between server status sweeps '
+                        'while the awaited servers keep changing.')),
+   cfg.FloatOpt('server_poll_max_interval',
+                 min=0.1,
+                 default=10.0,
+                 help=_('Maximum interval in seconds between server status '
+                        'sweeps, the interval backs off up to it while the '
+                        'awaited servers do not change.')),
    cfg.StrOpt('host',
                default=socket.gethostname(),
                help=_('Name of the engine node. '
@@ -78,7 +160,27 @@ keystone_opts = [
                       ' http://0.0.0.0:35357/v3')),
     cfg.StrOpt('password',
                default='',
-               help=_('Privilidged user password'))]
+               help=_('Privilidged user password')),
+    cfg.IntOpt('session_cache_size',
+               min=1,
+               default=1000,
+               help=_('Maximum number of authenticated keystone sessions '
+                      'kept by an API worker.')),
+    cfg.IntOpt('session_cache_ttl',
+               min=0,
+               default=3600,
+               help=_('Number of seconds a keystone session is kept in '
+                      'cache. 0 means until evicted by newer sessions.')),
+    cfg.IntOpt('token_refresh_threshold',
+               min=0,
+               default=300,
+               help=_('Re-authenticate cached sessions whose token '
+                      'expires within this number of seconds.')),
+    cfg.IntOpt('connection_pool_size',
+               min=1,
+               default=100,
+               help=_('Maximum number of HTTP connections kept open per '
+                      'OpenStack endpoint.'))]
 
 gate_group = cfg.OptGroup('gate')
 gate_opts = [
@@ -93,7 +195,82 @@ gate_opts = [
                help=_('Image name to deploy VM from')),
     cfg.StrOpt('accessible_network',
                default='',
-               help=_('Network accesible from outside'))]
+               help=_('Network accesible from outside')),
+    cfg.IntOpt('provision_workers',
+               min=1,
+               default=100,
+               help=_('Maximum number of gates provisioned concurrently '
+                      'by a single API worker.')),
+    cfg.IntOpt('max_wait_timeout',
+               min=0,
+               default=60,
+               help=_('Maximum number of seconds a client may long-poll '
+                      'for a gate to leave the BUILDING state.')),
+    cfg.IntOpt('wait_poll_interval',
+               min=1,
+               default=2,
+               help=_('Interval in seconds to re-read gate state while '
+                      'long-polling a gate built by another API worker.')),
+    cfg.IntOpt('build_timeout',
+               min=1,
+               default=900,
+               help=_('Number of seconds a BUILDING gate may go without '
+                      'progress before its build is considered '
+                      'interrupted, e.g. by a restart of the API worker '
+                      'building it. Such gates are failed at startup and '
+                      'may be deleted.')),
+    cfg.IntOpt('list_default_limit',
+               min=1,
+               default=100,
+               help=_('Number of gates, keys or targets returned by a '
+                      'list request not giving a limit.')),
+    cfg.IntOpt('list_max_limit',
+               min=1,
+               default=1000,
+               help=_('Maximum number of gates, keys or targets returned '
+                      'by a single list request, larger limits are '
+                      'lowered to it.')),
+    cfg.IntOpt('ssh_pool_size',
+               min=1,
+               default=200,
+               help=_('Maximum number of SSH connections to gates kept '
+                      'open by an API worker.')),
+    cfg.IntOpt('ssh_idle_timeout',
+               min=0,
+               default=300,
+               help=_('Number of seconds an unused SSH connection to a '
+                      'gate is kept open. 0 means until evicted by newer '
+                      'connections.')),
+    cfg.IntOpt('ssh_keepalive_interval',
+               min=0,
+               default=30,
+               help=_('Interval in seconds between keepalive packets sent '
+                      'on idle SSH connections to gates. 0 disables '
+                      'keepalives.')),
+    cfg.IntOpt('deploy_workers',
+               min=1,
+               default=20,
+               help=_('Maximum number of gates keys are deployed to '
+                      'concurrently by a single bulk request.')),
+    cfg.IntOpt('config_cache_size',
+               min=1,
+               default=10000,
+               help=_('Maximum number of SSH config entity tags kept by '
+                      'an API worker.')),
+    cfg.IntOpt('config_cache_ttl',
+               min=0,
+               default=300,
+               help=_('Number of seconds an SSH config entity tag is '
+                      'trusted without reading the config inputs. Bounds '
+                      'how long address changes of targets may go '
+                      'unnoticed by conditional requests.')),
+    cfg.IntOpt('key_sync_interval',
+               min=0,
+               default=600,
+               help=_('Interval in seconds between reconciliations of the '
+                      'keys of all gates with the database. 0 disables '
+                      'periodic reconciliation, gates are then only '
+                      'synced when their keys change.'))]
 
 
 def list_opts():
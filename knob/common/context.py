@@ -12,12 +12,6 @@
 #    under the License.
 import datetime
 import os
-from keystoneauth1.identity import v3
-from keystoneauth1 import token_endpoint
-from keystoneauth1 import session
-from keystoneclient.v3 import client
-
-from oslo_config import cfg
 from oslo_context import context
 from oslo_log import log as logging
 from oslo_middleware import request_id as oslo_request_id
@@ -27,11 +21,11 @@ import oslo_messaging
 
 from knob.common import exception
 from knob.common import policy
+from knob.common import sessions
 from knob.common import wsgi
 from knob.db.sqlalchemy import api as db_api
-from knob.clients import neutron
-from knob.clients import barbican
 from knob.clients import nova
+from knob.clients import pool
 
 LOG = logging.getLogger(__name__)
 
@@ -65,6 +59,8 @@ class MyRequestContext(context.RequestContext):
         self._barbican_client = None
         self._nova_client = None
         self._keystone_client = None
+        # server id -> server object or None, fetched by this request
+        self._servers = {}
         
         self.policy = policy.Enforcer()
 
@@ -77,16 +73,12 @@ class MyRequestContext(context.RequestContext):
         #else:
         #    self.is_admin = is_admin
             
+        self._keystone_session = None
+        self._session_scope = (user_name, tenant_name,
+                               sessions.DEFAULT_DOMAIN)
         if auth_token is not None:
-            auth_url = cfg.CONF.keystone.auth_url
-            password = cfg.CONF.keystone.password
-            auth = v3.Password(auth_url=auth_url,
-                           username=user_name,
-                           password=password,
-                           project_name=tenant_name,
-                           user_domain_id='default',
-                           project_domain_name='default')
-            self._keystone_session = session.Session(auth=auth, verify=False)
+            # authenticated sessions are shared by requests of the tenant
+            self._keystone_session = sessions.get_session(*self._session_scope)
             
                     
     @property
@@ -115,30 +107,80 @@ class MyRequestContext(context.RequestContext):
             self._session = db_api.get_session()
         return self._session
 
+    def invalidate_session(self):
+        """Forget the shared keystone session, e.g. after Unauthorized.
+
+        The next request of the tenant authenticates again, pooled
+        clients of the tenant are rebuilt on the new session.
+        """
+        if self._keystone_session is not None:
+            sessions.invalidate_session(*self._session_scope)
+
+    def _pooled_client(self, service):
+        return pool.get_client(service, self._session_scope,
+                               self._keystone_session)
+
     @property
     def neutron_client(self):
         if self._neutron_client is None:
-            self._neutron_client = neutron.NeutronClient(self._keystone_session)
+            self._neutron_client = self._pooled_client('neutron')
         return self._neutron_client
         
     @property
     def barbican_client(self):
         if self._barbican_client is None:
-            self._barbican_client = barbican.BarbicanClient(self._keystone_session)
+            self._barbican_client = self._pooled_client('barbican')
         return self._barbican_client
     
     @property
     def nova_client(self):
         if self._nova_client is None:
-            self._nova_client = nova.NovaClient(self._keystone_session)
+            self._nova_client = self._pooled_client('nova')
         return self._nova_client
     
     @property
     def keystone_client(self):
         if self._keystone_client is None:
-            self._keystone_client = client.Client(session=self._keystone_session)
+            self._keystone_client = self._pooled_client('keystone')
         return self._keystone_client
 
+    def get_servers(self, server_ids):
+        """Return dict of server id -> server object of known servers.
+
+        Servers are fetched by a single Nova call and memoized, so a server
+        is never fetched twice while serving the same request.
+        """
+        missing = set(server_ids).difference(self._servers)
+        if missing:
+            found = self.nova_client.get_servers(missing)
+            for server_id in missing:
+                self._servers[server_id] = found.get(server_id)
+        return dict((server_id, self._servers[server_id])
+                    for server_id in server_ids
+                    if self._servers[server_id] is not None)
+
+    def get_server(self, server_id):
+        """Return memoized server object, raise EntityNotFound if unknown."""
+        server = self.get_servers([server_id]).get(server_id)
+        if server is None:
+            raise exception.EntityNotFound(entity='Server', name=server_id)
+        return server
+
+    def get_ip(self, server_id, net_type, ip_version, extended_type):
+        """Return IP of a server, see NovaClient.get_ip.
+
+        Cached addresses are only served for servers already fetched while
+        serving this request, others are fetched first so Nova checks they
+        are visible to the tenant.
+        """
+        server = self.get_server(server_id)
+        ip = nova.cached_ip(server_id, net_type, ip_version, extended_type)
+        if ip is None:
+            nova.cache_addresses(server)
+            ip = self.nova_client.server_ip(server, net_type, ip_version,
+                                            extended_type)
+        return ip
+
 
 def get_admin_context(show_deleted=False):
     return MyRequestContext(is_admin=True, show_deleted=show_deleted)
@@ -0,0 +1,101 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Dependency aware step executor.
+
+Steps are run on green threads as soon as all the steps they require are
+complete. Results of the required steps are passed to a step as keyword
+arguments named after them.
+"""
+
+import collections
+import sys
+
+import eventlet
+from eventlet import queue
+import six
+
+
+class StepGraph(object):
+    """Directed acyclic graph of steps run concurrently."""
+
+    def __init__(self):
+        self._steps = collections.OrderedDict()
+
+    def add(self, name, func, requires=()):
+        """Add a step to the graph.
+
+        :param name: unique name of the step
+        :param func: callable accepting results of required steps as
+                     keyword arguments
+        :param requires: names of the steps which must complete first,
+                         those must be already added to the graph
+        """
+        if name in self._steps:
+            raise ValueError('Step %s is already defined' % name)
+        for req in requires:
+            if req not in self._steps:
+                raise ValueError('Step %s requires unknown step %s' %
+                                 (name, req))
+        self._steps[name] = (func, tuple(requires))
+
+    @staticmethod
+    def _call(name, func, kwargs, results):
+        try:
+            results.put((name, func(**kwargs), None))
+        except Exception:
+            results.put((name, None, sys.exc_info()))
+
+    def run(self, on_complete=None):
+        """Run all the steps and return dict of their results.
+
+        :param on_complete: optional callable(name, result) invoked from
+                            the calling green thread once a step succeeds
+        On the first failing step no more steps are started, the steps
+        already running are waited for and the failure is re-raised.
+        """
+        pending = collections.OrderedDict(self._steps)
+        done = {}
+        results = queue.LightQueue()
+        pool = eventlet.GreenPool(max(len(pending), 1))
+        running = 0
+        failure = None
+
+        while pending or running:
+            if failure is None:
+                for name, (func, requires) in list(pending.items()):
+                    if all(req in done for req in requires):
+                        del pending[name]
+                        kwargs = dict((req, done[req]) for req in requires)
+                        pool.spawn_n(self._call, name, func, kwargs, results)
+                        running += 1
+            if not running:
+                break
+
+            name, result, exc_info = results.get()
+            running -= 1
+            if exc_info is not None:
+                if failure is None:
+                    failure = exc_info
+                continue
+            done[name] = result
+            if on_complete is not None:
+                try:
+                    on_complete(name, result)
+                except Exception:
+                    if failure is None:
+                        failure = sys.exc_info()
+
+        if failure is not None:
+            six.reraise(*failure)
+        return done
@@ -0,0 +1,108 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Process wide cache of authenticated keystone sessions.
+
+Sessions are keyed by (user, project, domain) and share a single
+requests connection pool, so repeated calls of the same tenant neither
+re-authenticate nor open new TCP/TLS connections.
+"""
+
+from keystoneauth1.identity import v3
+from keystoneauth1 import session
+from oslo_config import cfg
+from oslo_log import log as logging
+import requests
+from requests import adapters
+
+from knob.common import cache
+
+LOG = logging.getLogger(__name__)
+
+cfg.CONF.import_group('keystone', 'knob.common.config')
+
+DEFAULT_DOMAIN = 'default'
+
+_sessions = None
+_http_session = None
+
+
+def _get_cache():
+    global _sessions
+    if _sessions is None:
+        _sessions = cache.TTLCache(cfg.CONF.keystone.session_cache_size,
+                                   cfg.CONF.keystone.session_cache_ttl)
+    return _sessions
+
+
+def _get_http_session():
+    """Return requests session whose connection pool is shared."""
+    global _http_session
+    if _http_session is None:
+        pool_size = cfg.CONF.keystone.connection_pool_size
+        adapter = adapters.HTTPAdapter(pool_connections=pool_size,
+                                       pool_maxsize=pool_size)
+        http_session = requests.Session()
+        http_session.mount('http://', adapter)
+        http_session.mount('https://', adapter)
+        _http_session = http_session
+    return _http_session
+
+
+def _create_session(user_name, project_name, domain):
+    auth = v3.Password(auth_url=cfg.CONF.keystone.auth_url,
+                       username=user_name,
+                       password=cfg.CONF.keystone.password,
+                       project_name=project_name,
+                       user_domain_id=domain,
+                       project_domain_name=domain)
+    LOG.debug('Creating keystone session for %s/%s' %
+              (user_name, project_name))
+    return session.Session(auth=auth, verify=False,
+                           session=_get_http_session())
+
+
+def _refresh_if_expiring(sess):
+    auth_ref = sess.auth.auth_ref
+    threshold = cfg.CONF.keystone.token_refresh_threshold
+    if auth_ref is not None and auth_ref.will_expire_soon(threshold):
+        # token is fetched again on the next request
+        LOG.debug('Keystone token is about to expire, re-authenticating')
+        sess.auth.invalidate()
+
+
+def get_session(user_name, project_name, domain=DEFAULT_DOMAIN):
+    """Return authenticated keystone session for the given scope."""
+    key = (user_name, project_name, domain)
+    sessions = _get_cache()
+    sess = sessions.get(key)
+    if sess is None:
+        sess = _create_session(user_name, project_name, domain)
+        sessions.set(key, sess)
+    else:
+        _refresh_if_expiring(sess)
+    return sess
+
+
+def is_rejected(ex):
+    """Return True if a client call failed as its credentials were rejected.
+
+    keystoneauth and the service clients each raise their own
+    Unauthorized class.
+    """
+    return type(ex).__name__ == 'Unauthorized'
+
+
+def invalidate_session(user_name, project_name, domain=DEFAULT_DOMAIN):
+    """Forget cached session, e.g. when its credentials were rejected."""
+    _get_cache().pop((user_name, project_name, domain))
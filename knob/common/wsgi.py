@@ -51,6 +51,7 @@ from knob.common.i18n import _LE
 from knob.common.i18n import _LI
 from knob.common.i18n import _LW
 from knob.common import serializers
+from knob.common import sessions
 
 
 LOG = logging.getLogger(__name__)
@@ -180,7 +181,12 @@ def get_socket(conf, default_port):
 class Server(object):
     """Server class to manage multiple WSGI sockets and applications."""
 
-    def __init__(self, name, conf, threads=1000):
+    def __init__(self, name, conf, threads=1000, on_worker_start=None):
+        """Create server.
+
+        :param on_worker_start: optional callable run by every worker
+                                process before it serves requests
+        """
         os.umask(0o27)  # ensure files are created with the correct privileges
         self._logger = logging.getLogger("eventlet.wsgi.server")
         self.name = name
@@ -190,6 +196,7 @@ class Server(object):
         self.running = True
         self.pgid = os.getpid()
         self.conf = conf
+        self.on_worker_start = on_worker_start
         try:
             os.setpgid(self.pgid, self.pgid)
         except OSError:
@@ -231,6 +238,8 @@ class Server(object):
         elif workers == 1:
             # Useful for profiling, test, debug etc.
             self.pool = eventlet.GreenPool(size=self.threads)
+            if self.on_worker_start is not None:
+                self.on_worker_start()
             self.pool.spawn_n(self._single_run, self.application, self.sock)
             return
         # childs equal specified value of workers
@@ -445,6 +454,9 @@ class Server(object):
         eventlet.hubs.use_hub('poll')
         eventlet.patcher.monkey_patch(all=False, socket=True)
         self.pool = eventlet.GreenPool(size=self.threads)
+        if self.on_worker_start is not None:
+            # green threads started before the fork do not survive it
+            self.on_worker_start()
         socket_timeout = cfg.CONF.eventlet_opts.client_socket_timeout or None
         try:
             eventlet.wsgi.server(
@@ -786,6 +798,10 @@ class Resource(object):
             raise translate_exception(err, request.best_match_language())
         except Exception as err:
             log_exception(err, sys.exc_info())
+            ctx = getattr(request, 'context', None)
+            if ctx is not None and sessions.is_rejected(err):
+                # do not reuse the session for the cache TTL
+                ctx.invalidate_session()
             raise translate_exception(err, request.best_match_language())
         # Here we support either passing in a serializer or detecting it
         # based on the content type.
@@ -12,6 +12,7 @@
 #    under the License.
 """Implementation of SQLAlchemy backend."""
 from oslo_config import cfg
+from oslo_db import exception as db_exception
 from oslo_db import options
 from oslo_db.sqlalchemy import enginefacade
 from oslo_db.sqlalchemy import utils
@@ -21,6 +22,7 @@ from oslo_utils import timeutils
 #import osprofiler.sqlalchemy
 import six
 import sqlalchemy
+from sqlalchemy import orm
 
 from knob.common import exception
 from knob.common.i18n import _
@@ -97,43 +99,173 @@ def soft_delete_aware_query(context, *args, **kwargs):
     return query
 
 
+def _filter_query(query, model, filters):
+    """Apply equality, membership and created_at range filters."""
+    filters = dict(filters or {})
+    created_since = filters.pop('created_since', None)
+    created_before = filters.pop('created_before', None)
+    if created_since is not None:
+        query = query.filter(model.created_at >= created_since)
+    if created_before is not None:
+        query = query.filter(model.created_at < created_before)
+    for key, value in six.iteritems(filters):
+        column = getattr(model, key)
+        if isinstance(value, (list, tuple, set)):
+            query = query.filter(column.in_(list(value)))
+        else:
+            query = query.filter(column == value)
+    return query
+
+
+def _select_rows(query, model, fields):
+    """Return values of the fields of the matched rows as tuples.
+
+    Only the fields columns are selected and no model instances are
+    built nor tracked by the session, for read-only listings.
+    """
+    return query.with_entities(
+        *[getattr(model, field) for field in fields]).all()
+
+
+def _paginate_query(context, query, model, limit=None, marker=None,
+                    sort_keys=None, sort_dir=None, unique_key='id',
+                    marker_query=None):
+    """Page through a query sorted by the given keys, entirely in SQL.
+
+    :param marker: unique key value of the last row of the previous page
+    :param unique_key: column making the sort order deterministic
+    :param marker_query: query the marker row is looked up by
+    """
+    sort_keys = list(sort_keys or ['created_at'])
+    if unique_key not in sort_keys:
+        sort_keys.append(unique_key)
+
+    model_marker = None
+    if marker is not None:
+        if marker_query is None:
+            marker_query = context.session.query(model)
+        model_marker = marker_query.filter(
+            getattr(model, unique_key) == marker).first()
+        if model_marker is None:
+            raise exception.NotFound(_('Marker %s not found') % marker)
+    try:
+        return utils.paginate_query(query, model, limit, sort_keys,
+                                    marker=model_marker,
+                                    sort_dir=sort_dir or 'asc')
+    except utils.InvalidSortKey as ex:
+        raise exception.Invalid(six.text_type(ex))
+
+
+def _gate_query(context):
+    """Return query of the gates visible in the context.
+
+    Gates are scoped to the tenant of the request unless it is an admin
+    one, lookups use the (tenant_id, ...) indexes.
+    """
+    query = context.session.query(models.Gate)
+    if not context.is_admin:
+        query = query.filter_by(tenant_id=context.tenant_id)
+    return query
+
+
 def gate_create(context, values):
     obj_ref = models.Gate()
     obj_ref.update(values)
     session = context.session
 
-    with session.begin():
-        obj_ref.save(session)
+    try:
+        with session.begin():
+            obj_ref.save(session)
+    except db_exception.DBDuplicateEntry as ex:
+        raise exception.DbObjectDuplicateEntry(models.Gate, ex)
 
     return obj_ref
 
 
 def gate_get(context, gate_id):
-    result = context.session.query(
-        models.Gate).get(gate_id)
+    result = _gate_query(context).filter_by(id=gate_id).first()
 
     if not result:
         raise exception.NotFound(_('Gate with id %s not found') %
                                  gate_id)
     return result
 
+def gate_get_expanded(context, gate_id, expand):
+    """Return gate with its expanded relations loaded along with it.
+
+    :param expand: names of the relations to load, keys and/or targets
+
+    The first relation is joined to the gate query, further ones are
+    loaded by a single query each, joining both would return keys times
+    targets rows.
+    """
+    query = _gate_query(context)
+    for index, relation in enumerate(expand):
+        loader = orm.joinedload if index == 0 else orm.subqueryload
+        query = query.options(loader(getattr(models.Gate, relation)))
+    result = query.filter_by(id=gate_id).first()
+
+    if not result:
+        raise exception.NotFound(_('Gate with id %s not found') %
+                                 gate_id)
+    return result
+
+
 def gate_get_by_name(context, name):
-    return (context.session.query(models.Gate).
-            filter_by(name=name).one_or_none())
+    return _gate_query(context).filter_by(name=name).one_or_none()
     
-def gate_get_all(context, tenant_id=None):
-    query = context.session.query(models.Gate)
-    if tenant_id:
-        query = query.filter_by(tenant_id=tenant_id)
-    return query.all()
+def gate_get_all(context, fields, filters=None, limit=None, marker=None,
+                 sort_keys=None, sort_dir=None):
+    """Return tuples of the fields values of the visible gates."""
+    query = _filter_query(_gate_query(context), models.Gate, filters)
+    query = _paginate_query(context, query, models.Gate, limit, marker,
+                            sort_keys, sort_dir,
+                            marker_query=_gate_query(context))
+    return _select_rows(query, models.Gate, fields)
 
 
 def gate_update(context, deployment_id, values):
     deployment = gate_get(context, deployment_id)
+    values = dict(values,
+                  config_generation=models.Gate.config_generation + 1)
     update_and_save(context, deployment, values)
     return deployment
 
 
+def gate_config_generations(context, gate_id=None):
+    """Return (id, config generation) tuples of the gates visible."""
+    query = _gate_query(context)
+    if gate_id is not None:
+        query = query.filter_by(id=gate_id)
+    return query.with_entities(models.Gate.id,
+                               models.Gate.config_generation).all()
+
+
+def gate_set_keys_fingerprint(context, gate_id, fingerprint,
+                              expected=None):
+    """Record fingerprint of the key set applied to a gate VM.
+
+    Only the fingerprint column is written, configs keep their generation.
+
+    :param expected: only replace this recorded fingerprint
+    :returns: True if recorded
+    """
+    session = context.session
+    with session.begin(subtransactions=True):
+        query = session.query(models.Gate).filter_by(id=gate_id)
+        if expected is not None:
+            query = query.filter_by(keys_fingerprint=expected)
+        return bool(query.update({'keys_fingerprint': fingerprint},
+                                 synchronize_session=False))
+
+
+def _bump_config_generation(session, gate_ids):
+    """Bump config generation of gates whose targets changed."""
+    session.query(models.Gate).filter(models.Gate.id.in_(gate_ids)).update(
+        {'config_generation': models.Gate.config_generation + 1},
+        synchronize_session=False)
+
+
 def gate_delete(context, gate_id):
     gate = gate_get(context, gate_id)
     session = context.session
@@ -151,6 +283,33 @@ def target_get_all_by_args(context, gate_id, target_id):
                 filter_by(gate_id=gate_id).all())
 
 
+def target_get_all(context, gate_id, fields, filters=None, limit=None,
+                   marker=None, sort_keys=None, sort_dir=None):
+    """Return tuples of the fields values of the targets of a gate."""
+    query = _filter_query(
+        context.session.query(models.Target).filter_by(gate_id=gate_id),
+        models.Target, filters)
+    query = _paginate_query(context, query, models.Target, limit, marker,
+                            sort_keys, sort_dir, unique_key='server_id')
+    return _select_rows(query, models.Target, fields)
+
+
+def target_get_all_with_gates(context, target_fields, gate_fields,
+                              gate_id=None):
+    """Return rows of the visible gates targets by a single join.
+
+    Rows hold values of the target fields followed by the gate ones.
+    """
+    query = _gate_query(context).join(
+        models.Target, models.Target.gate_id == models.Gate.id)
+    if gate_id is not None:
+        query = query.filter(models.Gate.id == gate_id)
+    query = query.order_by(models.Gate.id, models.Target.name)
+    return query.with_entities(
+        *([getattr(models.Target, field) for field in target_fields] +
+          [getattr(models.Gate, field) for field in gate_fields])).all()
+
+
 def target_create(context, values):
     obj_ref = models.Target()
     obj_ref.update(values)
@@ -158,10 +317,36 @@ def target_create(context, values):
 
     with session.begin():
         obj_ref.save(session)
+        _bump_config_generation(session, [obj_ref.gate_id])
 
     return obj_ref
 
 
+def target_create_all(context, values_list):
+    """Create many targets by a single multi-row insert.
+
+    Targets whose server is already registered are skipped.
+
+    :returns: dict of server id -> gate id of the skipped targets
+    """
+    session = context.session
+    server_ids = [values['server_id'] for values in values_list]
+    try:
+        with session.begin():
+            existing = dict(session.query(
+                models.Target.server_id, models.Target.gate_id).filter(
+                    models.Target.server_id.in_(server_ids)))
+            new = [values for values in values_list
+                   if values['server_id'] not in existing]
+            if new:
+                session.bulk_insert_mappings(models.Target, new)
+                _bump_config_generation(
+                    session, set(values['gate_id'] for values in new))
+    except db_exception.DBDuplicateEntry as ex:
+        raise exception.DbObjectDuplicateEntry(models.Target, ex)
+    return existing
+
+
 def target_get(context, target_id):
     result = context.session.query(
         models.Target).get(target_id)
@@ -177,6 +362,7 @@ def target_delete(context, deployment_id):
     session = context.session
     with session.begin(subtransactions=True):
         session.delete(deployment)
+        _bump_config_generation(session, [deployment.gate_id])
 
 
 def key_create(context, values):
@@ -190,6 +376,20 @@ def key_create(context, values):
     return obj_ref
 
 
+def key_create_all(context, values_list):
+    """Create many keys in a single transaction."""
+    obj_refs = []
+    session = context.session
+    with session.begin():
+        for values in values_list:
+            obj_ref = models.Key()
+            obj_ref.update(values)
+            obj_ref.save(session)
+            obj_refs.append(obj_ref)
+
+    return obj_refs
+
+
 def key_get(context, key_id):
     result = context.session.query(
         models.Key).get(key_id)
@@ -226,6 +426,17 @@ def key_get_all_by_args(context, gate_id, key_id):
                 filter_by(gate_id=gate_id).all())
 
 
+def key_get_all(context, gate_id, fields, filters=None, limit=None,
+                marker=None, sort_keys=None, sort_dir=None):
+    """Return tuples of the fields values of the keys of a gate."""
+    query = _filter_query(
+        context.session.query(models.Key).filter_by(gate_id=gate_id),
+        models.Key, filters)
+    query = _paginate_query(context, query, models.Key, limit, marker,
+                            sort_keys, sort_dir)
+    return _select_rows(query, models.Key, fields)
+
+
 def service_create(context, values):
     service = models.Service()
     service.update(values)
@@ -258,16 +469,18 @@ def service_get(context, service_id):
     return result
 
 
-def service_get_all(context):
-    return (context.session.query(models.Service).
-            filter_by(deleted_at=None).all())
+def service_get_all(context, fields):
+    return _select_rows(context.session.query(models.Service).
+                        filter_by(deleted_at=None),
+                        models.Service, fields)
 
 
-def service_get_all_by_args(context, host, binary, topic):
-    return (context.session.query(models.Service).
-            filter_by(host=host).
-            filter_by(binary=binary).
-            filter_by(topic=topic).all())
+def service_get_all_by_args(context, fields, host, binary, topic):
+    return _select_rows(context.session.query(models.Service).
+                        filter_by(host=host).
+                        filter_by(binary=binary).
+                        filter_by(topic=topic),
+                        models.Service, fields)
 
 
 
@@ -0,0 +1,31 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Column, MetaData, String, Table, Text
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    gates = Table('gates', meta, autoload=True)
+
+    # gates are now provisioned in background, keep track of their state
+    Column('status', String(length=255)).create(gates)
+    Column('status_reason', Text).create(gates)
+
+    # resources are created one by one, so the gate row exists before
+    # any of them is known
+    gates.c.fip_id.alter(nullable=True)
+    gates.c.port_id.alter(nullable=True)
+    gates.c.server_id.alter(nullable=True)
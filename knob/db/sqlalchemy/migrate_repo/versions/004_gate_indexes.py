@@ -0,0 +1,32 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from migrate.changeset import constraint
+from sqlalchemy import Index, MetaData, Table
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    gates = Table('gates', meta, autoload=True)
+
+    # gates are listed per tenant, newest last
+    Index('ix_gates_tenant_id_created_at',
+          gates.c.tenant_id, gates.c.created_at).create(migrate_engine)
+    Index('ix_gates_server_id', gates.c.server_id).create(migrate_engine)
+
+    # gate names are unique within a tenant, also serves lookups by name
+    constraint.UniqueConstraint(
+        'tenant_id', 'name', table=gates,
+        name='uniq_gates0tenant_id0name').create()
@@ -69,12 +69,30 @@ class Gate(BASE, KnobBase):
     """Represents a Ssh gates (VM hosts)"""
 
     __tablename__ = 'gates'
+    __table_args__ = (
+        schema.Index('ix_gates_tenant_id_created_at',
+                     'tenant_id', 'created_at'),
+        schema.Index('ix_gates_server_id', 'server_id'),
+        schema.UniqueConstraint('tenant_id', 'name',
+                                name='uniq_gates0tenant_id0name'),
+        KnobBase.__table_args__
+    )
     id = Column(Integer, primary_key=True, nullable=False)
     name = Column(String(255), nullable=False)  # , ForeignKey('hosts.id'))
-    fip_id = Column(String(36), nullable=False)
-    port_id = Column(String(36), nullable=False)
-    server_id = Column(String(36), nullable=False)
+    fip_id = Column(String(36))
+    port_id = Column(String(36))
+    server_id = Column(String(36))
     tenant_id = Column(String(36))
+    status = Column(String(255))
+    status_reason = Column(Text)
+    floating_ip = Column(String(64))
+    fixed_ip = Column(String(64))
+    host_key_fingerprint = Column(String(255))
+    # bumped along with every change of the gate or its targets
+    config_generation = Column(Integer, nullable=False, default=0,
+                               server_default='0')
+    # key set last pushed to the gate VM, see knob.api.reconciler
+    keys_fingerprint = Column(String(64))
     
 class Key(BASE, KnobBase):
     """Represents a Ssh associates that allowed to work with service."""
@@ -41,3 +41,61 @@ class KnobObject(ovoo_base.VersionedObject):
             self._contextref = weakref.ref(context)
         else:
             self._contextref = None
+
+
+class KnobRecord(object):
+    """Read-only record of a DB row for list and read paths.
+
+    Records are built straight from row tuples, without the field
+    coercion and change tracking of versioned objects, and support the
+    read accessors of the objects they stand for. Subclasses list their
+    fields in __slots__, fields not loaded by sparse listings are unset.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def select(cls, fields=None, required=()):
+        """Return names of the fields to load, in the slots order.
+
+        :param fields: fields selected by the caller, all if empty
+        :param required: fields loaded even if not selected
+        """
+        if not fields:
+            return list(cls.__slots__)
+        wanted = set(fields) | set(required)
+        return [field for field in cls.__slots__ if field in wanted]
+
+    @classmethod
+    def from_row(cls, row, fields):
+        """Return record of the row holding values of the fields."""
+        record = cls.__new__(cls)
+        for field, value in zip(fields, row):
+            object.__setattr__(record, field, value)
+        return record
+
+    @classmethod
+    def from_model(cls, model):
+        """Return record of an already loaded model instance."""
+        return cls.from_row([model[field] for field in cls.__slots__],
+                            cls.__slots__)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s is read-only' % type(self).__name__)
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field)
+
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+
+    def obj_attr_is_set(self, field):
+        return hasattr(self, field)
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            '%s=%r' % (field, getattr(self, field))
+            for field in self.__slots__ if hasattr(self, field)))
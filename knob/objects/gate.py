@@ -30,10 +30,17 @@ class Gate(
     fields = {
         'id': fields.IntegerField(),
         'name': fields.StringField(),
-        'fip_id': fields.StringField(),
-        'port_id': fields.StringField(),
-        'server_id': fields.StringField(),
+        'fip_id': fields.StringField(nullable=True),
+        'port_id': fields.StringField(nullable=True),
+        'server_id': fields.StringField(nullable=True),
         'tenant_id': fields.StringField(),
+        'status': fields.StringField(nullable=True),
+        'status_reason': fields.StringField(nullable=True),
+        'floating_ip': fields.StringField(nullable=True),
+        'fixed_ip': fields.StringField(nullable=True),
+        'host_key_fingerprint': fields.StringField(nullable=True),
+        'config_generation': fields.IntegerField(),
+        'keys_fingerprint': fields.StringField(nullable=True),
         'created_at': fields.DateTimeField(read_only=True),
         'updated_at': fields.DateTimeField(nullable=True),
         'deleted_at': fields.DateTimeField(nullable=True),
@@ -58,6 +65,27 @@ class Gate(
             context, cls(),
             db_api.gate_get(context, gate_id))
         
+    @classmethod
+    def get_expanded(cls, context, gate_id, expand):
+        """Return gate and records of its relations loaded along with it.
+
+        :param expand: names of the relations to load, keys and/or targets
+        :returns: (gate, dict of relation name -> list of read-only records)
+        """
+        # target objects import gate ones
+        from knob.objects import key as key_obj
+        from knob.objects import target as target_obj
+        records = {'keys': key_obj.KeyRecord,
+                   'targets': target_obj.TargetRecord}
+
+        db_gate = db_api.gate_get_expanded(context, gate_id, expand)
+        relations = {}
+        for relation in expand:
+            record_cls = records[relation]
+            relations[relation] = [record_cls.from_model(db_obj)
+                                   for db_obj in db_gate[relation]]
+        return cls._from_db_object(context, cls(), db_gate), relations
+
     @classmethod
     def get_by_name(cls, context, gate_name):
         return cls._from_db_object(
@@ -65,10 +93,17 @@ class Gate(
             db_api.gate_get_by_name(context, gate_name))
 
     @classmethod
-    def get_all(cls, context, server_id=None):
-        return [cls._from_db_object(context, cls(), db_gate)
-                for db_gate in db_api.gate_get_all(
-                    context, server_id)]
+    def get_all(cls, context, filters=None, limit=None, marker=None,
+                sort_keys=None, sort_dir=None, fields=None):
+        """Return read-only records of the visible gates.
+
+        :param fields: only fields to load for sparse listings
+        """
+        fields = GateRecord.select(fields, required=['id'])
+        return [GateRecord.from_row(row, fields)
+                for row in db_api.gate_get_all(
+                    context, fields, filters, limit, marker, sort_keys,
+                    sort_dir)]
 
     @classmethod
     def update_by_id(cls, context, gate_id, values):
@@ -83,5 +118,25 @@ class Gate(
     @classmethod
     def delete(cls, context, gate_id):
         db_api.gate_delete(context, gate_id)
-        
-    
\ No newline at end of file
+
+    @classmethod
+    def get_config_generations(cls, context, gate_id=None):
+        """Return (id, config generation) tuples of the visible gates."""
+        return db_api.gate_config_generations(context, gate_id)
+
+    @classmethod
+    def set_keys_fingerprint(cls, context, gate_id, fingerprint,
+                             expected=None):
+        """Record fingerprint of the key set applied to the gate VM.
+
+        :param expected: only replace this recorded fingerprint
+        :returns: True if recorded
+        """
+        return db_api.gate_set_keys_fingerprint(context, gate_id,
+                                                fingerprint, expected)
+
+
+class GateRecord(knob_base.KnobRecord):
+    """Read-only gate of list and read paths."""
+
+    __slots__ = tuple(sorted(Gate.fields))
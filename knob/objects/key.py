@@ -49,6 +49,11 @@ class Key(
         return cls._from_db_object(
             context, cls(), db_api.key_create(context, values))
 
+    @classmethod
+    def create_all(cls, context, values_list):
+        return [cls._from_db_object(context, cls(), db_key)
+                for db_key in db_api.key_create_all(context, values_list)]
+
     @classmethod
     def get_by_id(cls, context, key_id):
         return cls._from_db_object(
@@ -61,6 +66,19 @@ class Key(
                 for db_key in db_api.key_get_all_by_args(
                     context, gate_id, key_id)]
 
+    @classmethod
+    def get_all(cls, context, gate_id, filters=None, limit=None, marker=None,
+                sort_keys=None, sort_dir=None, fields=None):
+        """Return read-only records of the keys of a gate.
+
+        :param fields: only fields to load for sparse listings
+        """
+        fields = KeyRecord.select(fields, required=['id'])
+        return [KeyRecord.from_row(row, fields)
+                for row in db_api.key_get_all(
+                    context, gate_id, fields, filters, limit, marker,
+                    sort_keys, sort_dir)]
+
     @classmethod
     def delete_by_name(cls, context, key_name):
         db_api.key_delete_by_name(context, key_name)
@@ -68,3 +86,9 @@ class Key(
     @classmethod
     def delete(cls, context, key_id):
         db_api.key_delete(context, key_id)
+
+
+class KeyRecord(knob_base.KnobRecord):
+    """Read-only key of list and read paths."""
+
+    __slots__ = tuple(sorted(Key.fields))
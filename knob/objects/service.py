@@ -44,11 +44,6 @@ class Service(
         service.obj_reset_changes()
         return service
 
-    @classmethod
-    def _from_db_objects(cls, context, list_obj):
-        return [cls._from_db_object(context, cls(context), obj)
-                for obj in list_obj]
-
     @classmethod
     def get_by_id(cls, context, service_id):
         service_db = db_api.service_get(context, service_id)
@@ -75,14 +70,24 @@ class Service(
 
     @classmethod
     def get_all(cls, context):
-        return cls._from_db_objects(context,
-                                    db_api.service_get_all(context))
+        """Return read-only records of the running services."""
+        fields = ServiceRecord.select()
+        return [ServiceRecord.from_row(row, fields)
+                for row in db_api.service_get_all(context, fields)]
 
     @classmethod
     def get_all_by_args(cls, context, host, binary, topic):
-        return cls._from_db_objects(
-            context,
-            db_api.service_get_all_by_args(context,
-                                           host,
-                                           binary,
-                                           topic))
+        """Return read-only records of the matching services."""
+        fields = ServiceRecord.select()
+        return [ServiceRecord.from_row(row, fields)
+                for row in db_api.service_get_all_by_args(context,
+                                                          fields,
+                                                          host,
+                                                          binary,
+                                                          topic)]
+
+
+class ServiceRecord(knob_base.KnobRecord):
+    """Read-only service of list and read paths."""
+
+    __slots__ = tuple(sorted(Service.fields))
@@ -20,6 +20,7 @@ from oslo_versionedobjects import fields
 
 from knob.db.sqlalchemy import api as db_api
 from knob.objects import base as knob_base
+from knob.objects import gate as gate_obj
 
 
 class Target(
@@ -49,6 +50,15 @@ class Target(
         return cls._from_db_object(
             context, cls(), db_api.target_create(context, values))
 
+    @classmethod
+    def create_all(cls, context, values_list):
+        """Create many targets at once.
+
+        :returns: dict of server id -> gate id of the targets skipped
+                  because their server is already registered
+        """
+        return db_api.target_create_all(context, values_list)
+
     @classmethod
     def get_by_id(cls, context, target_id):
         return cls._from_db_object(
@@ -64,3 +74,39 @@ class Target(
         return [cls._from_db_object(context, cls(), db_target)
                 for db_target in db_api.target_get_all_by_args(
                     context, gate_id, target_id)]
+
+    @classmethod
+    def get_all(cls, context, gate_id, filters=None, limit=None,
+                marker=None, sort_keys=None, sort_dir=None, fields=None):
+        """Return read-only records of the targets of a gate.
+
+        :param fields: only fields to load for sparse listings
+        """
+        fields = TargetRecord.select(fields, required=['server_id'])
+        return [TargetRecord.from_row(row, fields)
+                for row in db_api.target_get_all(
+                    context, gate_id, fields, filters, limit, marker,
+                    sort_keys, sort_dir)]
+
+    @classmethod
+    def get_all_with_gates(cls, context, gate_id=None):
+        """Return (target, gate) records of all targets of visible gates."""
+        target_fields = TargetRecord.select()
+        gate_fields = gate_obj.GateRecord.select()
+        split = len(target_fields)
+        gates = {}
+        result = []
+        for row in db_api.target_get_all_with_gates(
+                context, target_fields, gate_fields, gate_id):
+            gate = gate_obj.GateRecord.from_row(row[split:], gate_fields)
+            # targets of the same gate share its record
+            gate = gates.setdefault(gate.id, gate)
+            result.append(
+                (TargetRecord.from_row(row[:split], target_fields), gate))
+        return result
+
+
+class TargetRecord(knob_base.KnobRecord):
+    """Read-only target of list and read paths."""
+
+    __slots__ = tuple(sorted(Target.fields))